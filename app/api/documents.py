@@ -5,7 +5,7 @@ Documents API endpoints for file upload and document management.
 import logging
 from typing import Any, Dict, List, Optional
 
-from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, UploadFile
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
 from app.core.security import verify_jwt_token
@@ -73,16 +73,21 @@ async def upload_documents(
 
 @router.get("/processing-status/{batch_id}", tags=["Documents"])
 async def get_processing_status(
-    batch_id: str, current_user: Dict[str, Any] = Depends(get_current_user)
+    batch_id: str,
+    statuses: Optional[List[str]] = Query(None, description="File statuses to list"),
+    limit: int = Query(500, ge=1, le=5000, description="Maximum files to list"),
+    current_user: Dict[str, Any] = Depends(get_current_user),
 ):
     """
     Get detailed processing status for a batch of uploaded documents.
 
     - **batch_id**: Processing job ID returned from upload
-    - Returns batch status and individual file processing progress
+    - **statuses**: Optional file statuses whose files should be listed
+    - **limit**: Maximum number of files to list
+    - Returns batch status, per-status file counts and the requested files
     """
     try:
-        result = await processing_service.get_processing_status(batch_id)
+        result = await processing_service.get_processing_status(batch_id, statuses, limit)
         if not result["success"]:
             raise HTTPException(status_code=404, detail=result["error"])
         return result
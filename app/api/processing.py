@@ -305,7 +305,7 @@ async def retry_file_processing(
         ).eq("id", file_id).execute()
 
         # Queue for processing
-        success = processing_service.queue_text_extraction(file_id)
+        success = await processing_service.queue_text_extraction(file_id)
         if not success:
             raise HTTPException(status_code=500, detail="Failed to queue file for retry")
 
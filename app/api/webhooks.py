@@ -171,14 +171,14 @@ async def handle_batch_processing_completed(payload: Dict[str, Any]) -> Dict[str
         from app.core.database import db
 
         batch_info = result["batch_info"]
-        files_by_status = result["files_by_status"]
+        status_counts = result["status_counts"]
 
         # Calculate final statistics
-        completed_files = len(files_by_status.get("review_pending", []))
-        completed_files += len(files_by_status.get("approved", []))
-        failed_files = len(files_by_status.get("extraction_failed", []))
-        failed_files += len(files_by_status.get("analysis_failed", []))
-        failed_files += len(files_by_status.get("embedding_failed", []))
+        completed_files = status_counts.get("review_pending", 0)
+        completed_files += status_counts.get("approved", 0)
+        failed_files = status_counts.get("extraction_failed", 0)
+        failed_files += status_counts.get("analysis_failed", 0)
+        failed_files += status_counts.get("embedding_failed", 0)
 
         # Determine final batch status
         from app.models.enums import BatchStatus
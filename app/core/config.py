@@ -17,6 +17,8 @@ class Settings(BaseSettings):
     supabase_secret_key: str
     supabase_pat_token: Optional[str] = None  # Personal Access Token for CLI/MCP
     railway_token: Optional[str] = None  # Railway deployment token
+    supabase_max_connections: int = 100  # Pooled HTTP/2 connections to Supabase
+    supabase_max_keepalive_connections: int = 50
 
     # JWT Configuration (ES256 with JWK)
     supabase_jwt_public_key: Optional[str] = None  # Legacy, not used with JWK
@@ -32,6 +34,7 @@ class Settings(BaseSettings):
     # AI Services
     openai_api_key: Optional[str] = None
     anthropic_api_key: Optional[str] = None
+    openai_max_connections: int = 32  # Pooled HTTP/2 connections for OpenAI requests
 
     # Webhook Configuration
     webhook_secret: Optional[str] = None
@@ -42,11 +45,24 @@ class Settings(BaseSettings):
     # File Processing Limits
     max_file_size: int = 52428800  # 50MB
     max_files_per_batch: int = 50
+    max_concurrent_uploads: int = 8  # Files uploaded to storage/DB in parallel per worker
+    # Also match uploads against SHA-256 content hashes written before the switch to BLAKE3;
+    # disable once scripts/backfill_content_hash.py has re-hashed the existing rows
+    legacy_sha256_dedup: bool = True
     supported_mime_types: str = "application/pdf,text/plain,text/markdown,application/vnd.openxmlformats-officedocument.wordprocessingml.document"
 
     # Processing Configuration
     chunk_size: int = 1000
     chunk_overlap: int = 200
+    chunk_tokens: int = 250  # Token-based chunk size for the embedding service
+    chunk_overlap_tokens: int = 50
+    max_text_length: int = 5_000_000  # Stop extracting once a document exceeds this many chars
+
+    # Pipeline concurrency, per backend (per worker)
+    max_concurrent_extractions: int = 8  # Files in download/extract/embed at once
+    max_concurrent_ai_requests: int = 4  # Metadata extraction calls at once
+    max_concurrent_embedding_requests: int = 16  # OpenAI embedding requests at once, all files
+    pipeline_claim_lease_seconds: int = 600  # In-flight file claims lapse unless renewed
     embedding_model: str = "text-embedding-3-small"
     max_retries: int = 3
 
@@ -3,11 +3,14 @@ Database connection and Supabase client configuration.
 Handles both direct Supabase operations and raw SQL when needed.
 """
 
+import asyncio
 import logging
 from typing import Optional
 
+import httpx
+
 from app.core.config import settings
-from supabase import AsyncClient, acreate_client  # type: ignore
+from supabase import AsyncClient, AsyncClientOptions, acreate_client  # type: ignore
 
 logger = logging.getLogger(__name__)
 
@@ -17,17 +20,42 @@ class DatabaseManager:
 
     def __init__(self) -> None:
         self._supabase_client: Optional[AsyncClient] = None
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._client_lock = asyncio.Lock()
 
     async def get_supabase_client(self) -> AsyncClient:
         """Get or create async Supabase client."""
-        if self._supabase_client is None:
-            self._supabase_client = await acreate_client(
-                settings.supabase_url,
-                settings.supabase_secret_key,  # Using secret key for backend operations
-            )
-            logger.info("Async Supabase client initialized")
+        if self._supabase_client is not None:
+            return self._supabase_client
+
+        # Concurrent first callers must not each build a client and connection pool
+        async with self._client_lock:
+            if self._supabase_client is None:
+                # Shared HTTP/2 pool so PostgREST and storage calls reuse warm TLS connections
+                self._http_client = httpx.AsyncClient(
+                    http2=True,
+                    limits=httpx.Limits(
+                        max_connections=settings.supabase_max_connections,
+                        max_keepalive_connections=settings.supabase_max_keepalive_connections,
+                        keepalive_expiry=60,
+                    ),
+                    timeout=httpx.Timeout(60.0),
+                )
+                self._supabase_client = await acreate_client(
+                    settings.supabase_url,
+                    settings.supabase_secret_key,  # Using secret key for backend operations
+                    options=AsyncClientOptions(httpx_client=self._http_client),
+                )
+                logger.info("Async Supabase client initialized")
         return self._supabase_client
 
+    async def close(self) -> None:
+        """Close the pooled HTTP connections behind the Supabase client."""
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+        self._supabase_client = None
+
     @property
     async def supabase(self) -> AsyncClient:
         """Property to get async Supabase client."""
@@ -0,0 +1,23 @@
+"""
+Shared HTTP connection pools for outbound API calls.
+"""
+
+import httpx
+
+from app.core.config import settings
+
+# One HTTP/2 pool for all OpenAI traffic (LangChain embeddings and AI metadata calls), so
+# concurrent files multiplex over warm connections instead of paying a TLS handshake per request
+openai_http_client = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(
+        max_connections=settings.openai_max_connections,
+        max_keepalive_connections=settings.openai_max_connections,
+    ),
+    timeout=httpx.Timeout(60.0),
+)
+
+
+async def close_http_clients() -> None:
+    """Close the shared connection pools on application shutdown."""
+    await openai_http_client.aclose()
@@ -2,6 +2,7 @@
 Main FastAPI application for TBG RAG Document Ingestion System.
 """
 
+import asyncio
 import logging
 from datetime import datetime
 
@@ -13,6 +14,8 @@ from fastapi.responses import JSONResponse
 from app.api import documents, processing, webhooks
 from app.core.config import settings
 from app.core.database import db
+from app.core.http_clients import close_http_clients
+from app.services.langchain_processor import langchain_processor, shutdown_pdf_process_pool
 
 # Configure logging
 logging.basicConfig(
@@ -63,11 +66,22 @@ async def startup_event():
         logger.error(f"Database health check threw exception: {e}")
         logger.warning("Starting app despite database health check exception")
 
+    # Load the embedding tokenizer off the event loop before the first upload arrives
+    await asyncio.to_thread(langchain_processor.warm_up)
+
+    # Pick up files that were queued but unfinished when the previous process stopped
+    await documents.file_service.processing_service.resume_queued_files()
+
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Application shutdown tasks."""
     logger.info("Shutting down TBG RAG Document Ingestion API")
+    # Stop in-flight files before their clients close; they resume on the next start
+    await documents.file_service.processing_service.stop_pipeline_workers()
+    await db.close()
+    await close_http_clients()
+    await asyncio.to_thread(shutdown_pdf_process_pool)
 
 
 @app.get("/", tags=["Health"])
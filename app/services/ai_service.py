@@ -2,20 +2,61 @@
 AI service for metadata extraction and document analysis.
 """
 
+import asyncio
 import json
 import logging
+import re
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 
 import openai
-from anthropic import Anthropic
+from anthropic import AsyncAnthropic
 
 from app.core.config import settings
 from app.core.database import db
+from app.core.http_clients import openai_http_client
 from app.models.enums import DocumentCategory, DocumentType, FileStatus
 
 logger = logging.getLogger(__name__)
 
+# Patterns compiled once at import time and shared across AIService instances
+# Estate patterns that indicate wrongful death
+_ESTATE_PATTERNS = [
+    re.compile(pattern)
+    for pattern in [
+        r"\bestate\s+of\s+[a-z]+",
+        r"\bestate\s+v\.",
+        r"[a-z]+\s+estate\s+v\.",
+        r"\bestate\b.*\bv\b",
+        r"\bv\b.*\bestate\b",
+    ]
+]
+_DOLLAR_RE = re.compile(
+    r"\$[\d,]+(?:\.\d{2})?(?:\s*(?:million|billion|thousand|M|B|K))?", re.IGNORECASE
+)
+_PERCENT_RE = re.compile(r"(\d+(?:\.\d+)?)\s*%")
+_CASE_RE = re.compile(
+    r"([A-Z][a-zA-Z]+(?:\s+[A-Z][a-zA-Z]+)*)\s+v\.\s+([A-Z][a-zA-Z]+(?:\s+[A-Z][a-zA-Z]+)*)"
+)
+_DATE_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in [
+        r"(?:January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{1,2},?\s+\d{4}",
+        r"\d{1,2}/\d{1,2}/\d{4}",
+        r"\d{4}-\d{2}-\d{2}",
+    ]
+]
+_COURT_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in [
+        r"(?:United States |U\.S\. )?(?:District |Circuit |Supreme )?Court[^,\.]{0,30}",
+        r"(?:Superior|Municipal|County) Court[^,\.]{0,30}",
+        r"\d+(?:st|nd|rd|th) (?:Circuit|District)[^,\.]{0,30}",
+    ]
+]
+_FILE_EXTENSION_RE = re.compile(r"\.[^.]+$")
+_SEPARATOR_RE = re.compile(r"[_-]")
+
 
 class AIService:
     """Handles AI-powered metadata extraction and document analysis."""
@@ -27,7 +68,9 @@ class AIService:
         # Initialize OpenAI client if API key is available
         if settings.openai_api_key and settings.openai_api_key.strip():
             try:
-                self.openai_client = openai.AsyncOpenAI(api_key=settings.openai_api_key)
+                self.openai_client = openai.AsyncOpenAI(
+                    api_key=settings.openai_api_key, http_client=openai_http_client
+                )
                 logger.info("OpenAI AI service initialized successfully")
             except Exception as e:
                 logger.error(f"Failed to initialize OpenAI client: {e}")
@@ -36,7 +79,7 @@ class AIService:
         # Initialize Anthropic client if API key is available
         if settings.anthropic_api_key and settings.anthropic_api_key.strip():
             try:
-                self.anthropic_client = Anthropic(api_key=settings.anthropic_api_key)
+                self.anthropic_client = AsyncAnthropic(api_key=settings.anthropic_api_key)
                 logger.info("Anthropic AI service initialized successfully")
             except Exception as e:
                 logger.error(f"Failed to initialize Anthropic client: {e}")
@@ -45,12 +88,15 @@ class AIService:
         if not self.openai_client and not self.anthropic_client:
             logger.warning("No AI API keys configured - metadata extraction will be limited")
 
-    async def extract_metadata(self, file_id: str) -> Dict[str, Any]:
+    async def extract_metadata(
+        self, file_id: str, file_record: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
         """
         Extract metadata from a processing file using AI.
 
         Args:
             file_id: Processing file ID
+            file_record: Processing file row with extracted text, if the caller already has it
 
         Returns:
             Dict with extraction results
@@ -58,33 +104,52 @@ class AIService:
         logger.info(f"Starting AI metadata extraction for file {file_id}")
 
         try:
-            # Get file record with extracted text
-            client = await db.get_supabase_client()
-            file_result = await (
-                client.table("processing_files").select("*").eq("id", file_id).execute()
-            )
-            if not file_result.data:
-                raise ValueError(f"File {file_id} not found")
+            # Get file record with extracted text unless the pipeline passed it in
+            if file_record is None:
+                client = await db.get_supabase_client()
+                file_result = await (
+                    client.table("processing_files")
+                    .select(
+                        "extracted_text, original_filename, preview_text, page_count, "
+                        "word_count, char_count, chunk_count"
+                    )
+                    .eq("id", file_id)
+                    .execute()
+                )
+                if not file_result.data:
+                    raise ValueError(f"File {file_id} not found")
 
-            file_record = file_result.data[0]
+                file_record = file_result.data[0]
 
             if not file_record.get("extracted_text"):
                 raise ValueError(f"No extracted text found for file {file_id}")
 
-            # Update status to extracting metadata
-            await self._update_file_status(file_id, FileStatus.ANALYZING_METADATA)
-            await self._update_document_processing_status(file_id, "analyzing_metadata")
-
-            # Extract metadata using AI
-            metadata_result = await self._extract_metadata_with_ai(
-                file_record["extracted_text"], file_record["original_filename"]
+            # Extract metadata using AI. The stage status only feeds UI progress, so it is
+            # written while the AI call runs rather than ahead of it
+            metadata_task = asyncio.create_task(
+                self._extract_metadata_with_ai(
+                    file_record["extracted_text"], file_record["original_filename"]
+                )
             )
+            try:
+                await self._update_pipeline_stage(
+                    file_id, FileStatus.ANALYZING_METADATA, "analyzing_metadata"
+                )
+                metadata_result = await metadata_task
+            finally:
+                # A failed stage write fails the file, so don't leave the AI call running
+                if not metadata_task.done():
+                    metadata_task.cancel()
+                    await asyncio.wait([metadata_task])
 
             if metadata_result["success"]:
-                # Save metadata to database
-                await self._save_metadata(file_id, metadata_result["metadata"])
-                await self._update_file_status(file_id, FileStatus.GENERATING_EMBEDDINGS)
-                await self._update_document_processing_status(file_id, "generating_embeddings")
+                # Save metadata to database alongside the next stage status
+                await asyncio.gather(
+                    self._save_metadata(file_id, metadata_result["metadata"]),
+                    self._update_pipeline_stage(
+                        file_id, FileStatus.GENERATING_EMBEDDINGS, "generating_embeddings"
+                    ),
+                )
 
                 # Include text metrics from the processing file record
                 enhanced_metadata = metadata_result["metadata"].copy()
@@ -182,75 +247,43 @@ class AIService:
 
     def _detect_estate_case(self, text: str, filename: str) -> bool:
         """Detect if this is likely a wrongful death case based on estate patterns."""
-        import re
-
         combined_text = f"{filename} {text[:2000]}".lower()
 
         # Look for estate patterns that indicate wrongful death
-        estate_patterns = [
-            r"\bestate\s+of\s+[a-z]+",
-            r"\bestate\s+v\.",
-            r"[a-z]+\s+estate\s+v\.",
-            r"\bestate\b.*\bv\b",
-            r"\bv\b.*\bestate\b",
-        ]
-
-        for pattern in estate_patterns:
-            if re.search(pattern, combined_text):
-                return True
-
-        return False
+        return any(pattern.search(combined_text) for pattern in _ESTATE_PATTERNS)
 
     def _extract_pattern_metadata(self, text: str) -> Dict[str, Any]:
         """Extract metadata using regex patterns for forensic economics data."""
-        import re
-
         metadata: Dict[str, Any] = {}
+        text_head = text[:3000]
 
         # Extract dollar amounts
-        dollar_pattern = r"\$[\d,]+(?:\.\d{2})?(?:\s*(?:million|billion|thousand|M|B|K))?"
-        dollar_matches = re.findall(dollar_pattern, text, re.IGNORECASE)
+        dollar_matches = _DOLLAR_RE.findall(text)
         if dollar_matches:
             metadata["dollar_amounts"] = list(set(dollar_matches[:10]))
 
         # Extract percentages (potential discount rates)
-        percent_pattern = r"(\d+(?:\.\d+)?)\s*%"
-        percent_matches = re.findall(percent_pattern, text)
+        percent_matches = _PERCENT_RE.findall(text)
         if percent_matches:
             rates = [float(p) for p in percent_matches if 0 < float(p) < 30]
             if rates:
                 metadata["potential_discount_rates"] = list(set(rates[:5]))
 
         # Extract case citations (e.g., "Smith v. Jones")
-        case_pattern = (
-            r"([A-Z][a-zA-Z]+(?:\s+[A-Z][a-zA-Z]+)*)\s+v\.\s+([A-Z][a-zA-Z]+(?:\s+[A-Z][a-zA-Z]+)*)"
-        )
-        case_matches = re.findall(case_pattern, text[:3000])
+        case_matches = _CASE_RE.findall(text_head)
         if case_matches:
             metadata["case_names"] = [f"{p} v. {d}" for p, d in case_matches[:3]]
 
         # Extract dates
-        date_patterns = [
-            r"(?:January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{1,2},?\s+\d{4}",
-            r"\d{1,2}/\d{1,2}/\d{4}",
-            r"\d{4}-\d{2}-\d{2}",
-        ]
-
-        for pattern in date_patterns:
-            matches = re.findall(pattern, text[:3000], re.IGNORECASE)
+        for pattern in _DATE_PATTERNS:
+            matches = pattern.findall(text_head)
             if matches:
                 metadata["extracted_dates"] = matches[:5]
                 break
 
         # Extract court names
-        court_patterns = [
-            r"(?:United States |U\.S\. )?(?:District |Circuit |Supreme )?Court[^,\.]{0,30}",
-            r"(?:Superior|Municipal|County) Court[^,\.]{0,30}",
-            r"\d+(?:st|nd|rd|th) (?:Circuit|District)[^,\.]{0,30}",
-        ]
-
-        for pattern in court_patterns:
-            court_match = re.search(pattern, text[:3000], re.IGNORECASE)
+        for pattern in _COURT_PATTERNS:
+            court_match = pattern.search(text_head)
             if court_match:
                 metadata["court"] = court_match.group().strip()
                 break
@@ -259,12 +292,10 @@ class AIService:
 
     def _extract_title_from_filename(self, filename: str) -> str:
         """Clean up filename to use as fallback title."""
-        import re
-
         # Remove extension
-        title = re.sub(r"\.[^.]+$", "", filename)
+        title = _FILE_EXTENSION_RE.sub("", filename)
         # Replace underscores and hyphens with spaces
-        title = re.sub(r"[_-]", " ", title)
+        title = _SEPARATOR_RE.sub(" ", title)
         # Remove extra whitespace
         title = " ".join(title.split())
         # Title case
@@ -344,7 +375,7 @@ Return ONLY valid JSON with no additional text or formatting:
     async def _extract_with_anthropic(self, prompt: str) -> Dict[str, Any]:
         """Extract metadata using Anthropic Claude."""
         try:
-            response = self.anthropic_client.messages.create(
+            response = await self.anthropic_client.messages.create(
                 model="claude-3-haiku-20240307",
                 max_tokens=2000,
                 temperature=0.1,
@@ -483,7 +514,6 @@ Return ONLY valid JSON with no additional text or formatting:
                 "court": metadata.get("court"),
                 "jurisdiction": metadata.get("jurisdiction"),
                 "practice_area": metadata.get("practice_area"),
-                "updated_at": datetime.utcnow().isoformat(),
             }
 
             # Remove None values to avoid overwriting existing data with nulls
@@ -533,7 +563,6 @@ Return ONLY valid JSON with no additional text or formatting:
         try:
             update_data = {
                 "status": status.value,
-                "updated_at": datetime.utcnow().isoformat(),
                 **kwargs,
             }
 
@@ -544,36 +573,23 @@ Return ONLY valid JSON with no additional text or formatting:
             logger.error(f"Failed to update file {file_id} status: {e}")
             raise
 
-    async def _update_document_processing_status(self, file_id: str, processing_status: str):
-        """Update document processing status based on processing file ID."""
+    async def _update_pipeline_stage(
+        self, file_id: str, status: FileStatus, processing_status: str
+    ):
+        """Update file status and document processing status in one round-trip."""
         try:
             client = await db.get_supabase_client()
-
-            # Get document_id from processing file
-            file_result = (
-                await client.table("processing_files")
-                .select("document_id")
-                .eq("id", file_id)
-                .limit(1)
-                .execute()
-            )
-            if not file_result.data:
-                raise ValueError(f"Processing file {file_id} not found")
-
-            document_id = file_result.data[0]["document_id"]
-            if not document_id:
+            result = await client.rpc(
+                "update_pipeline_stage",
+                {"fid": file_id, "file_status": status.value, "doc_status": processing_status},
+            ).execute()
+            if not result.data:
                 raise ValueError(f"No document linked to processing file {file_id}")
 
-            # Update document with processing status
-            update_data = {
-                "processing_status": processing_status,
-                "updated_at": datetime.utcnow().isoformat(),
-            }
-            await client.table("documents").update(update_data).eq("id", document_id).execute()
-            logger.info(f"Updated document {document_id} processing_status to {processing_status}")
+            logger.info(f"Updated document {result.data} processing_status to {processing_status}")
 
         except Exception as e:
-            logger.error(f"Failed to update document processing status for file {file_id}: {e}")
+            logger.error(f"Failed to update pipeline stage for file {file_id}: {e}")
             raise
 
     def _detect_document_type(self, text: str, filename: str = "") -> str:
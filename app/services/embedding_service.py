@@ -3,13 +3,20 @@ Embedding service for generating vector embeddings from document text.
 """
 
 import asyncio
+import base64
 import logging
+import random
 import time
-from datetime import datetime
-from typing import Any, Dict, List, Optional
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import lru_cache
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import numpy as np
 import openai
+import tiktoken
+from supabase import AsyncClient  # type: ignore
 
 from app.core.config import settings
 from app.core.database import db
@@ -18,6 +25,60 @@ from app.models.enums import FileStatus
 
 logger = logging.getLogger(__name__)
 
+# OpenAI errors worth retrying: rate limits, 5xx responses, and connection problems/timeouts
+_RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.InternalServerError,
+    openai.APIConnectionError,
+    asyncio.TimeoutError,
+)
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    """Exponential backoff with jitter, honoring a Retry-After header when present."""
+    backoff = 2**attempt + random.random()
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    try:
+        return max(float(retry_after), backoff)
+    except (TypeError, ValueError):
+        return backoff
+
+
+def _batched(items: Iterable[str], size: int) -> Iterator[List[str]]:
+    """Yield successive lists of at most ``size`` items from an iterable."""
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(model: str) -> tiktoken.Encoding:
+    """Get the tokenizer for an embedding model, loaded once per process."""
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def _count_tokens(texts: List[str], model: str) -> List[int]:
+    """Count a model's tokens for each text (tiktoken encodes the batch in parallel)."""
+    encoded = _get_encoding(model).encode_batch(texts, disallowed_special=())
+    return [len(tokens) for tokens in encoded]
+
+
+def _decode_embeddings(encoded: List[str]) -> np.ndarray:
+    """Decode base64 embeddings returned by OpenAI into one contiguous float32 matrix."""
+    raw = b"".join(base64.b64decode(item) for item in encoded)
+    return np.frombuffer(raw, dtype=np.float32).reshape(len(encoded), -1)
+
+
+def _to_pgvector(vector: np.ndarray) -> str:
+    """Serialize a vector as a compact pgvector text literal at halfvec precision."""
+    # Embedding columns are halfvec, so float16 loses nothing; its shortest repr is
+    # also far fewer characters than float32, shrinking the insert payload.
+    return "[" + ",".join(map(str, vector.astype(np.float16))) + "]"
+
 
 class EmbeddingService:
     """Handles vector embedding generation for document text."""
@@ -25,19 +86,26 @@ class EmbeddingService:
     def __init__(self):
         self.openai_client = None
         self.embedding_model = settings.embedding_model
-        self.chunk_size = settings.chunk_size  # Use config value
-        self.chunk_overlap = min(
-            settings.chunk_overlap, settings.chunk_size // 4
+        self.chunk_tokens = settings.chunk_tokens  # Chunk size in model tokens
+        self.chunk_overlap_tokens = min(
+            settings.chunk_overlap_tokens, settings.chunk_tokens // 4
         )  # Ensure overlap is max 25% of chunk size
         self.max_chunks_per_document = 500  # Reasonable limit
+        # LRU cache of query embeddings; the model is fixed per instance so text is the key
+        self.query_cache_size = 1024
+        self._query_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
         logger.info(
-            f"Embedding service initialized with chunk_size={self.chunk_size}, chunk_overlap={self.chunk_overlap}"
+            f"Embedding service initialized with chunk_tokens={self.chunk_tokens}, "
+            f"chunk_overlap_tokens={self.chunk_overlap_tokens}"
         )
 
         # Initialize OpenAI client if API key is available
         if settings.openai_api_key and settings.openai_api_key.strip():
             try:
-                self.openai_client = openai.AsyncOpenAI(api_key=settings.openai_api_key)
+                # _embed_with_retry owns retries; the SDK's own would multiply them
+                self.openai_client = openai.AsyncOpenAI(
+                    api_key=settings.openai_api_key, max_retries=0
+                )
                 logger.info("OpenAI embedding service initialized successfully")
             except Exception as e:
                 logger.error(f"Failed to initialize OpenAI client: {e}")
@@ -76,7 +144,10 @@ class EmbeddingService:
             # Get file record with extracted text
             client = await db.get_supabase_client()
             file_result = await (
-                client.table("processing_files").select("*").eq("id", file_id).execute()
+                client.table("processing_files")
+                .select("extracted_text")
+                .eq("id", file_id)
+                .execute()
             )
             if not file_result.data:
                 raise ValueError(f"File {file_id} not found")
@@ -89,37 +160,19 @@ class EmbeddingService:
             # Update status to generating embeddings
             await self._update_file_status(file_id, FileStatus.GENERATING_EMBEDDINGS)
 
-            # Split text into chunks
+            # Split text into chunks lazily; only one stream batch is held in memory
             text_length = len(file_record["extracted_text"])
             processing_logger.log_step(
                 "text_chunking_start", file_id=file_id, text_length=text_length
             )
             chunks = self._split_text_into_chunks(file_record["extracted_text"])
-            processing_logger.log_step(
-                "text_chunking_complete",
-                file_id=file_id,
-                chunk_count=len(chunks),
-                text_length=text_length,
-            )
-            processing_logger.log_memory_warning(
-                "post_chunking", threshold_mb=200, file_id=file_id, chunk_count=len(chunks)
-            )
-
-            if len(chunks) > self.max_chunks_per_document:
-                processing_logger.log_step(
-                    "chunk_truncation",
-                    file_id=file_id,
-                    original_chunks=len(chunks),
-                    truncated_to=self.max_chunks_per_document,
-                )
-                chunks = chunks[: self.max_chunks_per_document]
 
             # Generate and save embeddings in streaming fashion to avoid memory buildup
             embed_start = time.time()
             processing_logger.log_step(
                 "embedding_generation_batch_start",
                 file_id=file_id,
-                total_chunks=len(chunks),
+                text_length=text_length,
                 max_chunks_per_doc=self.max_chunks_per_document,
             )
             processing_logger.log_memory_warning(
@@ -136,8 +189,9 @@ class EmbeddingService:
                 await self._update_file_status(file_id, FileStatus.REVIEW_PENDING)
 
                 total_duration = time.time() - start_time
+                chunk_count = embeddings_result.get("chunk_count", 0)
                 logger.info(
-                    f"🎯 EMBEDDING COMPLETE: File {file_id} ({len(chunks)} chunks) in {total_duration:.2f}s"
+                    f"🎯 EMBEDDING COMPLETE: File {file_id} ({chunk_count} chunks) in {total_duration:.2f}s"
                 )
                 return {
                     "success": True,
@@ -158,128 +212,99 @@ class EmbeddingService:
             )
             return {"success": False, "file_id": file_id, "error": str(e)}
 
-    def _split_text_into_chunks(self, text: str) -> List[str]:
-        """Split text into overlapping chunks for embedding."""
+    def _split_text_into_chunks(self, text: str) -> Iterator[str]:
+        """
+        Split text into overlapping token-sized chunks for embedding, yielding them one at a time.
+
+        Chunks are measured in model tokens so every chunk fills a similar share of the
+        embedding input. Where possible a chunk ends at a paragraph or sentence break in
+        the second half of its token window.
+        """
+        encoding = _get_encoding(self.embedding_model)
+        token_ids = encoding.encode(text, disallowed_special=())
+        total_tokens = len(token_ids)
+
         processing_logger.log_step(
             "chunk_splitting_start",
             text_length=len(text),
-            chunk_size=self.chunk_size,
-            chunk_overlap=self.chunk_overlap,
+            total_tokens=total_tokens,
+            chunk_tokens=self.chunk_tokens,
+            chunk_overlap_tokens=self.chunk_overlap_tokens,
         )
 
-        if len(text) <= self.chunk_size:
-            processing_logger.log_step(
-                "chunk_splitting_single_chunk", text_length=len(text), chunk_size=self.chunk_size
-            )
-            return [text]
-
-        chunks: List[str] = []
+        chunk_count = 0
         start = 0
-        iteration_count = 0  # Safety counter to detect infinite loops
-
-        while start < len(text):
-            iteration_count += 1
-
-            # Safety check to prevent infinite loops
-            if iteration_count > 10000:  # Reasonable maximum for any document
-                processing_logger.log_error(
-                    "chunk_splitting_infinite_loop_detected",
-                    Exception("Chunking exceeded 10,000 iterations - possible infinite loop"),
-                    text_length=len(text),
-                    chunk_size=self.chunk_size,
-                    chunk_overlap=self.chunk_overlap,
-                    current_start=start,
-                    chunks_created=len(chunks),
-                )
-                break
 
-            end = start + self.chunk_size
+        while start < total_tokens:
+            end = min(start + self.chunk_tokens, total_tokens)
+            chunk = encoding.decode(token_ids[start:end])
 
-            # If this isn't the last chunk, try to break at a sentence or paragraph
-            # But ensure we don't make chunks too small (min 50% of chunk_size)
-            min_chunk_end = start + (self.chunk_size // 2)
+            # If this isn't the last chunk, try to break at a paragraph or sentence
+            if end < total_tokens:
+                boundary = self._find_chunk_boundary(chunk)
+                if boundary:
+                    chunk = chunk[:boundary]
+                    end = start + len(encoding.encode(chunk, disallowed_special=()))
 
-            if end < len(text) and end > min_chunk_end:
-                # Look for paragraph break first (only in second half of chunk)
-                paragraph_break = text.rfind("\n\n", min_chunk_end, end)
-                if paragraph_break > start:
-                    end = paragraph_break
-                else:
-                    # Look for sentence break (only in second half of chunk)
-                    sentence_break = text.rfind(". ", min_chunk_end, end)
-                    if sentence_break > start:
-                        end = sentence_break + 1
-
-            chunk = text[start:end].strip()
+            chunk = chunk.strip()
             if chunk:
-                chunks.append(chunk)
+                yield chunk
+                chunk_count += 1
 
                 # Log progress every 1000 chunks to detect runaway chunking
-                if len(chunks) % 1000 == 0:
+                if chunk_count % 1000 == 0:
                     processing_logger.log_step(
                         "chunk_splitting_progress",
-                        chunks_created=len(chunks),
-                        iteration_count=iteration_count,
+                        chunks_created=chunk_count,
                         current_position=start,
-                        text_length=len(text),
-                        progress_percent=round((start / len(text)) * 100, 2),
+                        total_tokens=total_tokens,
+                        progress_percent=round((start / total_tokens) * 100, 2),
                     )
                     processing_logger.log_memory_warning(
-                        "chunking_memory_check", threshold_mb=1000, chunks_in_memory=len(chunks)
+                        "chunking_memory_check", threshold_mb=1000, chunks_created=chunk_count
                     )
 
-            # Move start position with overlap
-            if end >= len(text):
+            if end >= total_tokens:
                 break
 
-            # Calculate next start position, ensuring forward progress
-            # The next chunk should start at (end - overlap), but never go backwards
-            next_start = end - self.chunk_overlap
-
-            # Critical fix: Ensure we always move forward by at least 50 characters
-            # This prevents infinite loops when sentence breaks create small chunks
-            min_forward_progress = max(
-                50, self.chunk_size // 20
-            )  # At least 5% of chunk size or 50 chars
-            if next_start <= start:
-                next_start = start + min_forward_progress
-
-            start = next_start
+            # Next chunk starts `overlap` tokens back, but always moves forward
+            start = max(end - self.chunk_overlap_tokens, start + 1)
 
         processing_logger.log_step(
             "chunk_splitting_complete",
-            total_chunks=len(chunks),
-            iteration_count=iteration_count,
+            total_chunks=chunk_count,
+            total_tokens=total_tokens,
             text_length=len(text),
         )
 
-        return chunks
+    @staticmethod
+    def _find_chunk_boundary(chunk: str) -> Optional[int]:
+        """Find a paragraph or sentence break in the second half of a chunk."""
+        min_end = len(chunk) // 2
+
+        paragraph_break = chunk.rfind("\n\n", min_end)
+        if paragraph_break > 0:
+            return paragraph_break
+
+        sentence_break = chunk.rfind(". ", min_end)
+        if sentence_break > 0:
+            return sentence_break + 1
+
+        return None
 
     async def _generate_chunk_embeddings(self, chunks: List[str]) -> Dict[str, Any]:
         """Generate embeddings for text chunks using OpenAI API."""
         try:
             # Process chunks in batches to avoid rate limits
             batch_size = 100  # OpenAI allows up to 2048 inputs per request
-            all_embeddings = []
+            batch_matrices: List[np.ndarray] = []
 
             for i in range(0, len(chunks), batch_size):
                 batch_chunks = chunks[i : i + batch_size]
 
                 try:
-                    # Add timeout to prevent hanging
-                    response = await asyncio.wait_for(
-                        self.openai_client.embeddings.create(
-                            model=self.embedding_model, input=batch_chunks, encoding_format="float"
-                        ),
-                        timeout=60.0,  # 60 second timeout per batch
-                    )
-
-                    batch_embeddings = [data.embedding for data in response.data]
-                    all_embeddings.extend(batch_embeddings)
-
-                    # Rate limiting - be gentle with API
-                    if i + batch_size < len(chunks):
-                        await asyncio.sleep(0.1)
+                    batch_embeddings = await self._embed_with_retry(batch_chunks)
+                    batch_matrices.append(batch_embeddings)
 
                 except asyncio.TimeoutError:
                     logger.error(
@@ -290,19 +315,18 @@ class EmbeddingService:
                     logger.error(f"Embedding batch {i // batch_size + 1} failed: {e}")
                     return {"success": False, "error": f"OpenAI embedding API failed: {str(e)}"}
 
-            if len(all_embeddings) != len(chunks):
-                raise ValueError(
-                    f"Embedding count mismatch: {len(all_embeddings)} != {len(chunks)}"
-                )
+            embedded = sum(len(matrix) for matrix in batch_matrices)
+            if embedded != len(chunks):
+                raise ValueError(f"Embedding count mismatch: {embedded} != {len(chunks)}")
 
-            return {"success": True, "embeddings": all_embeddings}
+            return {"success": True, "embeddings": np.vstack(batch_matrices)}
 
         except Exception as e:
             logger.error(f"Embedding generation error: {e}")
             return {"success": False, "error": f"Embedding generation failed: {str(e)}"}
 
     async def _save_embeddings(
-        self, file_id: str, chunks: List[str], embeddings: List[List[float]]
+        self, file_id: str, chunks: List[str], embeddings: np.ndarray
     ):
         """Save text chunks and their embeddings to the database."""
         try:
@@ -311,10 +335,15 @@ class EmbeddingService:
             # Process and save chunks in smaller batches to avoid memory buildup
             batch_size = 50  # Smaller batches to reduce memory usage
             total_chunks = len(chunks)
+            created_at = datetime.now(timezone.utc).isoformat()
 
             for batch_start in range(0, total_chunks, batch_size):
                 batch_end = min(batch_start + batch_size, total_chunks)
 
+                token_counts = await asyncio.to_thread(
+                    _count_tokens, chunks[batch_start:batch_end], self.embedding_model
+                )
+
                 # Create batch data on-demand (not all at once)
                 chunk_batch = []
                 for i in range(batch_start, batch_end):
@@ -323,14 +352,16 @@ class EmbeddingService:
                             "processing_file_id": file_id,
                             "chunk_index": i,
                             "content": chunks[i],
-                            "embedding": embeddings[i],
-                            "token_count": len(chunks[i].split()),
-                            "created_at": datetime.utcnow().isoformat(),
+                            "embedding": _to_pgvector(embeddings[i]),
+                            "token_count": token_counts[i - batch_start],
+                            "created_at": created_at,
                         }
                     )
 
                 # Insert this batch
-                await client.table("document_chunks").insert(chunk_batch).execute()
+                await client.table("document_chunks").insert(
+                    chunk_batch, returning="minimal"
+                ).execute()
 
                 # Clear batch from memory immediately
                 del chunk_batch
@@ -351,168 +382,214 @@ class EmbeddingService:
             raise
 
     async def _generate_and_save_embeddings_streaming(
-        self, file_id: str, chunks: List[str]
+        self, file_id: str, chunks: Iterable[str]
     ) -> Dict[str, Any]:
-        """Generate embeddings and save in streaming fashion to avoid memory buildup."""
+        """
+        Generate embeddings and save in streaming fashion to avoid memory buildup.
+
+        Embedding (OpenAI) and inserting (Supabase) run as a producer/consumer pair
+        joined by a small bounded queue, so batch N+1 is embedded while batch N is
+        being written. Chunks beyond max_chunks_per_document are dropped.
+        """
+        stream_batch_size = 50  # Process this many chunks at a time
+        openai_batch_size = 20  # OpenAI API batch size (smaller to reduce memory)
+        producer = consumer = None
         try:
             client = await db.get_supabase_client()
-            total_chunks = len(chunks)
-            stream_batch_size = 50  # Process this many chunks at a time
-            openai_batch_size = 20  # OpenAI API batch size (smaller to reduce memory)
-            total_saved = 0
+            # At most two embedded batches wait on the database at any time
+            queue: asyncio.Queue = asyncio.Queue(maxsize=2)
 
             processing_logger.log_step(
                 "streaming_embeddings_start",
                 file_id=file_id,
-                total_chunks=total_chunks,
+                max_chunks=self.max_chunks_per_document,
                 stream_batch_size=stream_batch_size,
                 openai_batch_size=openai_batch_size,
             )
 
-            for stream_start in range(0, total_chunks, stream_batch_size):
-                stream_end = min(stream_start + stream_batch_size, total_chunks)
-                stream_chunks = chunks[stream_start:stream_end]
-
-                processing_logger.log_step(
-                    "stream_batch_start",
-                    file_id=file_id,
-                    batch_start=stream_start + 1,
-                    batch_end=stream_end,
-                    batch_size=len(stream_chunks),
-                    total_chunks=total_chunks,
-                )
-                processing_logger.log_memory_warning(
-                    "stream_batch_memory_check",
-                    threshold_mb=500,
-                    file_id=file_id,
-                    batch_number=stream_start // stream_batch_size + 1,
+            producer = asyncio.create_task(
+                self._produce_embeddings(
+                    file_id, chunks, queue, stream_batch_size, openai_batch_size
                 )
+            )
+            consumer = asyncio.create_task(self._consume_embeddings(file_id, queue, client))
+            _, (total_saved, embedding_dimension) = await asyncio.gather(producer, consumer)
+
+            # Update processing file with final chunk count
+            processing_logger.log_step(
+                "update_final_chunk_count", file_id=file_id, total_chunks_saved=total_saved
+            )
+            await client.table("processing_files").update({"chunk_count": total_saved}).eq(
+                "id", file_id
+            ).execute()
+
+            processing_logger.log_step(
+                "streaming_embeddings_complete",
+                file_id=file_id,
+                total_chunks_saved=total_saved,
+                embedding_dimension=embedding_dimension,
+            )
+            return {
+                "success": True,
+                "chunk_count": total_saved,
+                "embedding_dimension": embedding_dimension,
+            }
+
+        except asyncio.TimeoutError:
+            logger.error("Embedding batch timed out")
+            return {"success": False, "error": "OpenAI embedding API timed out"}
+        except openai.OpenAIError as e:
+            logger.error(f"Embedding batch failed: {e}")
+            return {"success": False, "error": f"OpenAI embedding API failed: {str(e)}"}
+        except Exception as e:
+            processing_logger.log_error("streaming_embeddings_failed", e, file_id=file_id)
+            return {"success": False, "error": f"Streaming embedding generation failed: {str(e)}"}
+        finally:
+            # If either side failed, stop the other so it doesn't block on the queue
+            for task in (producer, consumer):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    async def _produce_embeddings(
+        self,
+        file_id: str,
+        chunks: Iterable[str],
+        queue: asyncio.Queue,
+        stream_batch_size: int,
+        openai_batch_size: int,
+    ) -> None:
+        """Embed chunks batch by batch and hand them to the saver through the queue."""
+        chunk_iter = iter(chunks)
+        stream_start = 0
+        limited_chunks = islice(chunk_iter, self.max_chunks_per_document)
+        for stream_chunks in _batched(limited_chunks, stream_batch_size):
+            processing_logger.log_step(
+                "stream_batch_start",
+                file_id=file_id,
+                batch_start=stream_start + 1,
+                batch_end=stream_start + len(stream_chunks),
+                batch_size=len(stream_chunks),
+            )
+            processing_logger.log_memory_warning(
+                "stream_batch_memory_check",
+                threshold_mb=500,
+                file_id=file_id,
+                batch_number=stream_start // stream_batch_size + 1,
+            )
+
+            # Generate embeddings for this stream batch
+            batch_matrices: List[np.ndarray] = []
+            embedded = 0
+            processing_logger.log_step(
+                "openai_embedding_batches_start",
+                file_id=file_id,
+                stream_chunks_count=len(stream_chunks),
+            )
+            for i in range(0, len(stream_chunks), openai_batch_size):
+                openai_batch = stream_chunks[i : i + openai_batch_size]
+                batch_embeddings = await self._embed_with_retry(openai_batch)
+                batch_matrices.append(batch_embeddings)
+                embedded += len(batch_embeddings)
 
-                # Generate embeddings for this stream batch
-                stream_embeddings = []
-                processing_logger.log_step(
-                    "openai_embedding_batches_start",
-                    file_id=file_id,
-                    stream_chunks_count=len(stream_chunks),
-                )
-                for i in range(0, len(stream_chunks), openai_batch_size):
-                    openai_batch = stream_chunks[i : i + openai_batch_size]
-
-                    try:
-                        response = await asyncio.wait_for(
-                            self.openai_client.embeddings.create(
-                                model=self.embedding_model,
-                                input=openai_batch,
-                                encoding_format="float",
-                            ),
-                            timeout=60.0,
-                        )
-
-                        batch_embeddings = [data.embedding for data in response.data]
-                        stream_embeddings.extend(batch_embeddings)
-
-                        processing_logger.log_step(
-                            "openai_batch_complete",
-                            file_id=file_id,
-                            batch_size=len(openai_batch),
-                            embeddings_received=len(batch_embeddings),
-                            total_embeddings_so_far=len(stream_embeddings),
-                        )
-                        processing_logger.log_memory_warning(
-                            "post_openai_batch", threshold_mb=300, file_id=file_id
-                        )
-
-                        # Rate limiting
-                        await asyncio.sleep(0.1)
-
-                    except asyncio.TimeoutError:
-                        logger.error("Embedding batch timed out")
-                        return {"success": False, "error": "OpenAI embedding API timed out"}
-                    except Exception as e:
-                        logger.error(f"Embedding batch failed: {e}")
-                        return {"success": False, "error": f"OpenAI embedding API failed: {str(e)}"}
-
-                # Save this stream batch immediately
                 processing_logger.log_step(
-                    "database_save_start",
+                    "openai_batch_complete",
                     file_id=file_id,
-                    chunks_to_save=len(stream_chunks),
-                    embeddings_to_save=len(stream_embeddings),
+                    batch_size=len(openai_batch),
+                    embeddings_received=len(batch_embeddings),
+                    total_embeddings_so_far=embedded,
                 )
                 processing_logger.log_memory_warning(
-                    "pre_database_save", threshold_mb=500, file_id=file_id
+                    "post_openai_batch", threshold_mb=300, file_id=file_id
                 )
 
-                chunk_batch = []
-                for i, (chunk_text, embedding) in enumerate(zip(stream_chunks, stream_embeddings)):
-                    chunk_batch.append(
-                        {
-                            "processing_file_id": file_id,
-                            "chunk_index": stream_start + i,
-                            "content": chunk_text,
-                            "embedding": embedding,
-                            "token_count": len(chunk_text.split()),
-                            "created_at": datetime.utcnow().isoformat(),
-                        }
-                    )
+            # One contiguous float32 matrix for the whole stream batch
+            await queue.put((stream_start, stream_chunks, np.vstack(batch_matrices)))
+            del batch_matrices
+            stream_start += len(stream_chunks)
 
-                # Insert to database
-                processing_logger.log_step(
-                    "database_insert_start", file_id=file_id, chunk_batch_size=len(chunk_batch)
-                )
-                await client.table("document_chunks").insert(chunk_batch).execute()
-                total_saved += len(chunk_batch)
+        if next(chunk_iter, None) is not None:
+            processing_logger.log_step(
+                "chunk_truncation",
+                file_id=file_id,
+                truncated_to=self.max_chunks_per_document,
+            )
 
-                processing_logger.log_step(
-                    "database_insert_complete",
-                    file_id=file_id,
-                    chunks_saved=len(chunk_batch),
-                    total_saved=total_saved,
-                )
+        # Sentinel: no more batches
+        await queue.put(None)
 
-                # Clear memory immediately
-                processing_logger.log_step(
-                    "memory_cleanup_start",
-                    file_id=file_id,
-                    objects_to_delete=["stream_embeddings", "chunk_batch"],
-                )
-                del stream_embeddings
-                del chunk_batch
+    async def _consume_embeddings(
+        self, file_id: str, queue: asyncio.Queue, client: AsyncClient
+    ) -> Tuple[int, int]:
+        """
+        Insert embedded batches from the queue until the producer's sentinel arrives.
 
-                processing_logger.log_step(
-                    "stream_batch_complete",
-                    file_id=file_id,
-                    chunks_processed=len(stream_chunks),
-                    total_saved=total_saved,
-                )
-                processing_logger.log_memory_warning(
-                    "post_cleanup", threshold_mb=200, file_id=file_id
+        Returns:
+            Tuple of (total chunks saved, embedding dimension)
+        """
+        total_saved = 0
+        embedding_dimension = 0
+        while True:
+            item = await queue.get()
+            if item is None:
+                return total_saved, embedding_dimension
+
+            stream_start, stream_chunks, stream_embeddings = item
+            embedding_dimension = stream_embeddings.shape[1]
+
+            # Save this stream batch immediately
+            processing_logger.log_step(
+                "database_save_start",
+                file_id=file_id,
+                chunks_to_save=len(stream_chunks),
+                embeddings_to_save=len(stream_embeddings),
+            )
+            processing_logger.log_memory_warning(
+                "pre_database_save", threshold_mb=500, file_id=file_id
+            )
+
+            token_counts = await asyncio.to_thread(
+                _count_tokens, stream_chunks, self.embedding_model
+            )
+            chunk_batch = []
+            created_at = datetime.now(timezone.utc).isoformat()
+            for i, (chunk_text, embedding) in enumerate(zip(stream_chunks, stream_embeddings)):
+                chunk_batch.append(
+                    {
+                        "processing_file_id": file_id,
+                        "chunk_index": stream_start + i,
+                        "content": chunk_text,
+                        "embedding": _to_pgvector(embedding),
+                        "token_count": token_counts[i],
+                        "created_at": created_at,
+                    }
                 )
 
-            # Update processing file with final chunk count
+            # Insert to database
             processing_logger.log_step(
-                "update_final_chunk_count", file_id=file_id, total_chunks_saved=total_saved
+                "database_insert_start", file_id=file_id, chunk_batch_size=len(chunk_batch)
             )
-            await client.table("processing_files").update({"chunk_count": total_saved}).eq(
-                "id", file_id
-            ).execute()
+            await client.table("document_chunks").insert(chunk_batch, returning="minimal").execute()
+            total_saved += len(chunk_batch)
 
             processing_logger.log_step(
-                "streaming_embeddings_complete",
+                "database_insert_complete",
                 file_id=file_id,
-                total_chunks_saved=total_saved,
-                embedding_dimension=1536,
+                chunks_saved=len(chunk_batch),
+                total_saved=total_saved,
             )
-            return {"success": True, "chunk_count": total_saved, "embedding_dimension": 1536}
 
-        except Exception as e:
-            processing_logger.log_error(
-                "streaming_embeddings_failed",
-                e,
+            # Clear memory immediately
+            del stream_embeddings
+            del chunk_batch
+            del item
+
+            processing_logger.log_step(
+                "stream_batch_complete",
                 file_id=file_id,
-                total_chunks=total_chunks if "total_chunks" in locals() else "unknown",
+                chunks_processed=len(stream_chunks),
+                total_saved=total_saved,
             )
-            return {"success": False, "error": f"Streaming embedding generation failed: {str(e)}"}
+            processing_logger.log_memory_warning("post_cleanup", threshold_mb=200, file_id=file_id)
 
     async def search_similar_chunks(
         self,
@@ -538,58 +615,34 @@ class EmbeddingService:
             return []
 
         try:
-            # Generate embedding for query
-            response = await self.openai_client.embeddings.create(
-                model=self.embedding_model, input=[query_text], encoding_format="float"
-            )
+            # Generate embedding for query (cached for repeated queries)
+            query_vector = _to_pgvector(await self._embed_query(query_text))
 
-            query_embedding = response.data[0].embedding
-
-            # Build the SQL query for similarity search
-            # Note: This uses pgvector's cosine similarity operator (<->)
-            sql_query = f"""
-            SELECT
-                dc.content,
-                dc.chunk_index,
-                pf.original_filename,
-                pf.ai_title,
-                pf.ai_doc_type,
-                pf.ai_doc_category,
-                (1 - (dc.embedding <-> '[{','.join(map(str, query_embedding))}]'::vector)) as similarity_score
-            FROM document_chunks dc
-            JOIN processing_files pf ON dc.processing_file_id = pf.id
-            WHERE pf.status = 'processing_complete'
-            """
-
-            # Add category filter if specified
-            if doc_categories:
-                category_list = "', '".join(doc_categories)
-                sql_query += f" AND pf.ai_doc_category IN ('{category_list}')"
-
-            sql_query += f"""
-            ORDER BY dc.embedding <-> '[{','.join(map(str, query_embedding))}]'::vector
-            LIMIT {limit}
-            """
-
-            # Execute similarity search
+            # Execute similarity search via the search_chunks RPC (cosine distance, <=>)
+            # The threshold is applied in SQL so rows below it never consume LIMIT slots
             client = await db.get_supabase_client()
-            result = await client.rpc("sql_query", {"query": sql_query}).execute()
+            result = await client.rpc(
+                "search_chunks",
+                {
+                    "q": query_vector,
+                    "cats": doc_categories or None,
+                    "k": limit,
+                    "thr": similarity_threshold,
+                },
+            ).execute()
 
-            # Filter by similarity threshold
-            similar_chunks = []
-            for row in result.data:
-                if row.get("similarity_score", 0) >= similarity_threshold:
-                    similar_chunks.append(
-                        {
-                            "content": row["content"],
-                            "chunk_index": row["chunk_index"],
-                            "filename": row["original_filename"],
-                            "title": row["ai_title"],
-                            "doc_type": row["ai_doc_type"],
-                            "doc_category": row["ai_doc_category"],
-                            "similarity_score": row["similarity_score"],
-                        }
-                    )
+            similar_chunks = [
+                {
+                    "content": row["content"],
+                    "chunk_index": row["chunk_index"],
+                    "filename": row["original_filename"],
+                    "title": row["title"],
+                    "doc_type": row["doc_type"],
+                    "doc_category": row["doc_category"],
+                    "similarity_score": row["similarity_score"],
+                }
+                for row in result.data
+            ]
 
             return similar_chunks
 
@@ -597,12 +650,50 @@ class EmbeddingService:
             logger.error(f"Similarity search failed: {e}")
             return []
 
+    async def _embed_with_retry(self, texts: List[str]) -> np.ndarray:
+        """Embed a batch of texts, retrying rate limits and transient errors with backoff."""
+        for attempt in range(settings.max_retries + 1):
+            try:
+                response = await asyncio.wait_for(
+                    self.openai_client.embeddings.create(
+                        model=self.embedding_model, input=texts, encoding_format="base64"
+                    ),
+                    timeout=60.0,  # 60 second timeout per batch
+                )
+                return _decode_embeddings([data.embedding for data in response.data])
+
+            except _RETRYABLE_ERRORS as e:
+                if attempt >= settings.max_retries:
+                    raise
+                delay = _retry_delay(e, attempt)
+                logger.warning(
+                    f"Embedding request failed ({type(e).__name__}), retrying in {delay:.1f}s "
+                    f"(attempt {attempt + 1}/{settings.max_retries})"
+                )
+                await asyncio.sleep(delay)
+
+        raise RuntimeError("Embedding retries exhausted")
+
+    async def _embed_query(self, query_text: str) -> np.ndarray:
+        """Embed a search query, reusing recent results from an in-process LRU cache."""
+        cached = self._query_cache.get(query_text)
+        if cached is not None:
+            self._query_cache.move_to_end(query_text)
+            return cached
+
+        query_embedding = (await self._embed_with_retry([query_text]))[0]
+
+        self._query_cache[query_text] = query_embedding
+        if len(self._query_cache) > self.query_cache_size:
+            self._query_cache.popitem(last=False)
+
+        return query_embedding
+
     async def _update_file_status(self, file_id: str, status: FileStatus, **kwargs):
         """Update file processing status."""
         try:
             update_data = {
                 "status": status.value,
-                "updated_at": datetime.utcnow().isoformat(),
                 **kwargs,
             }
 
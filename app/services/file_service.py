@@ -5,28 +5,63 @@ File service for handling document uploads and storage operations.
 import asyncio
 import logging
 import time
-from datetime import datetime
-from typing import Any, Dict, List
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
 from uuid import uuid4
 
 from fastapi import UploadFile
 
 from app.core.config import settings
 from app.core.database import db
-from app.models.enums import BatchStatus, DocumentStatus, FileStatus
+from app.models.enums import BatchStatus, FileStatus
 from app.models.processing import UploadResponse
 from app.services.processing_service import ProcessingService
-from app.utils.file_utils import FileValidator, calculate_content_hash, generate_safe_filename
+from app.utils.file_utils import (
+    FileValidator,
+    content_hash_to_bytea,
+    generate_safe_filename,
+    new_content_hasher,
+    new_legacy_content_hasher,
+)
 
 logger = logging.getLogger(__name__)
 
+UPLOAD_READ_CHUNK_SIZE = 1024 * 1024  # 1 MiB
+HASH_OFFLOAD_THRESHOLD = 512 * 1024  # Smaller chunks hash faster inline than via a thread hop
+
+# Validation tables are built once and shared by every FileService
+_VALIDATOR = FileValidator()
+
+# Status strings written on every upload, resolved once at import
+_BATCH_CREATED = BatchStatus.CREATED.value
+_BATCH_PROCESSING = BatchStatus.PROCESSING.value
+_BATCH_FAILED = BatchStatus.FAILED.value
+_FILE_UPLOADED = FileStatus.UPLOADED.value
+
+
+def _update_hashers(chunk: bytes, *hashers) -> None:
+    """Feed an upload chunk to each content hasher that is in use."""
+    for hasher in hashers:
+        if hasher is not None:
+            hasher.update(chunk)
+
 
 class FileService:
     """Handles file upload, validation, and storage operations."""
 
     def __init__(self):
-        self.validator = FileValidator()
+        self.validator = _VALIDATOR
         self.processing_service = ProcessingService()
+        # Content hashes recently confirmed in the library -> duplicate response, checked
+        # before the database. Entries expire so deleted documents can be uploaded again.
+        self.hash_cache_size = 100_000
+        self.hash_cache_ttl = 600  # seconds
+        self._hash_cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        # Content hashes claimed by uploads that have no database records yet -> (job_id, filename)
+        self._inflight_hashes: Dict[str, Tuple[str, str]] = {}
+        # Shared by all requests so concurrent batches split one Supabase concurrency budget
+        self._upload_semaphore = asyncio.Semaphore(settings.max_concurrent_uploads)
 
     async def upload_files(self, files: List[UploadFile], user_id: str) -> UploadResponse:
         """
@@ -48,92 +83,155 @@ class FileService:
         if len(files) > settings.max_files_per_batch:
             raise ValueError(f"Too many files: {len(files)} (max: {settings.max_files_per_batch})")
 
-        # Create processing job
-        job_data = {
-            "total_files": len(files),
-            "processed_files": 0,
-            "completed_files": 0,
-            "failed_files": 0,
-            "status": BatchStatus.CREATED.value,  # Use enum value
-            "created_at": datetime.utcnow().isoformat(),
-        }
+        try:
+            # Create processing job
+            job_data = {
+                "total_files": len(files),
+                "processed_files": 0,
+                "completed_files": 0,
+                "failed_files": 0,
+                "status": _BATCH_CREATED,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+            }
 
-        logger.info(f"📝 Creating processing job for {len(files)} files")
-        client = await db.get_supabase_client()
-        job_result = await client.table("processing_jobs").insert(job_data).execute()
-        job_id = job_result.data[0]["id"]
-        logger.info(f"✅ Processing job created: {job_id}")
+            logger.info(f"📝 Creating processing job for {len(files)} files")
+            client = await db.get_supabase_client()
+            job_result = await client.table("processing_jobs").insert(job_data).execute()
+            job_id = job_result.data[0]["id"]
+            logger.info(f"✅ Processing job created: {job_id}")
+
+            uploaded_files, failed_files = await self._upload_batch_files(files, job_id, user_id)
+
+            # Update job with results
+            await client.table("processing_jobs").update(
+                {
+                    "status": _BATCH_PROCESSING if uploaded_files else _BATCH_FAILED,
+                    "processed_files": len(uploaded_files) + len(failed_files),
+                    "failed_files": len(failed_files),
+                }
+            ).eq("id", job_id).execute()
 
-        uploaded_files = []
-        failed_files = []
+            # Start background processing for successful uploads
+            if uploaded_files:
+                asyncio.create_task(self._start_background_processing(uploaded_files))
 
-        # Process each file
-        for i, file in enumerate(files, 1):
-            file_start = time.time()
-            logger.info(f"📄 Processing file {i}/{len(files)}: {file.filename} ({file.size} bytes)")
-            try:
-                file_result = await self._process_single_file(file, job_id, user_id)
-                file_duration = time.time() - file_start
+            total_duration = time.time() - start_time
+            logger.info(
+                f"🎯 UPLOAD COMPLETE: {len(uploaded_files)} successful, {len(failed_files)} failed in {total_duration:.2f}s"
+            )
+
+            return UploadResponse(
+                job_id=job_id,
+                uploaded_files=uploaded_files,
+                failed_files=failed_files,
+                total_files=len(files),
+                success_count=len(uploaded_files),
+                error_count=len(failed_files),
+            )
+
+        except Exception as e:
+            # Still record how long the batch ran before failing
+            total_duration = time.time() - start_time
+            logger.error(
+                f"❌ UPLOAD FAILED: {len(files)} files for user {user_id} after {total_duration:.2f}s: {e}"
+            )
+            raise
+
+    async def _upload_batch_files(
+        self, files: List[UploadFile], job_id: str, user_id: str
+    ) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """
+        Store every file of a batch and create its database records.
+
+        Args:
+            files: List of uploaded files
+            job_id: Processing job ID
+            user_id: ID of the user uploading files
 
-                if file_result["success"]:
-                    uploaded_files.append(file_result["file_id"])
-                    logger.info(
-                        f"✅ File processed successfully: {file.filename} in {file_duration:.2f}s"
-                    )
+        Returns:
+            Tuple of (uploaded processing file IDs, failed file details)
+        """
+        try:
+            # Process files concurrently; each upload is dominated by storage and DB round-trips.
+            # While one file waits on storage, others hash or run their dedup lookup.
+            tasks = [
+                self._process_file_with_semaphore(
+                    self._upload_semaphore, file, job_id, user_id, i, len(files)
+                )
+                for i, file in enumerate(files, 1)
+            ]
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+
+            uploaded_files = []
+            failed_files = []
+            prepared_files = []
+
+            for file, file_result in zip(files, results):
+                if isinstance(file_result, Exception):
+                    failed_files.append({"filename": file.filename, "error": str(file_result)})
+                elif file_result["success"]:
+                    prepared_files.append((file, file_result))
                 else:
                     failure_info = {"filename": file.filename, "error": file_result["error"]}
                     if file_result.get("is_duplicate"):
                         failure_info["is_duplicate"] = True
-                        failure_info["existing_document_id"] = file_result.get(
-                            "existing_document_id"
-                        )
+                        failure_info["existing_document_id"] = file_result.get("existing_document_id")
                     failed_files.append(failure_info)
-                    logger.error(
-                        f"❌ File processing failed: {file.filename} - {file_result['error']} ({file_duration:.2f}s)"
-                    )
 
+            # Create database records for every stored file, in bulk where possible
+            if prepared_files:
+                uploaded_files, insert_failures = await self._insert_file_records(
+                    [file_result for _, file_result in prepared_files]
+                )
+                failed_files.extend(insert_failures)
+
+            return uploaded_files, failed_files
+
+        finally:
+            # Stored files are now visible to check_content_hash
+            self._release_hashes(job_id)
+
+    async def _process_file_with_semaphore(
+        self,
+        semaphore: asyncio.Semaphore,
+        file: UploadFile,
+        job_id: str,
+        user_id: str,
+        index: int,
+        total: int,
+    ) -> Dict[str, Any]:
+        """Process a single uploaded file with concurrency control."""
+        async with semaphore:
+            file_start = time.time()
+            logger.info(f"📄 Processing file {index}/{total}: {file.filename} ({file.size} bytes)")
+            try:
+                file_result = await self._process_single_file(file, job_id, user_id)
             except Exception as e:
                 file_duration = time.time() - file_start
                 logger.error(
                     f"❌ Exception processing file {file.filename}: {e} ({file_duration:.2f}s)"
                 )
-                failed_files.append({"filename": file.filename, "error": str(e)})
-
-        # Update job with results
-        client = await db.get_supabase_client()
-        await client.table("processing_jobs").update(
-            {
-                "status": BatchStatus.PROCESSING.value
-                if uploaded_files
-                else BatchStatus.FAILED.value,
-                "processed_files": len(uploaded_files) + len(failed_files),
-                "failed_files": len(failed_files),
-            }
-        ).eq("id", job_id).execute()
-
-        # Start background processing for successful uploads
-        if uploaded_files:
-            asyncio.create_task(self._start_background_processing(uploaded_files))
-
-        return UploadResponse(
-            job_id=job_id,
-            uploaded_files=uploaded_files,
-            failed_files=failed_files,
-            total_files=len(files),
-            success_count=len(uploaded_files),
-            error_count=len(failed_files),
-        )
+                raise
 
-        total_duration = time.time() - start_time
-        logger.info(
-            f"🎯 UPLOAD COMPLETE: {len(uploaded_files)} successful, {len(failed_files)} failed in {total_duration:.2f}s"
-        )
+            file_duration = time.time() - file_start
+            if file_result["success"]:
+                logger.info(
+                    f"✅ File processed successfully: {file.filename} in {file_duration:.2f}s"
+                )
+            else:
+                logger.error(
+                    f"❌ File processing failed: {file.filename} - {file_result['error']} ({file_duration:.2f}s)"
+                )
+            return file_result
 
     async def _process_single_file(
         self, file: UploadFile, job_id: str, user_id: str
     ) -> Dict[str, Any]:
         """
-        Process a single uploaded file.
+        Validate, deduplicate and store a single uploaded file.
+
+        Database rows are prepared but not inserted; upload_files writes them for the
+        whole batch via _insert_file_records.
 
         Args:
             file: Uploaded file
@@ -141,94 +239,110 @@ class FileService:
             user_id: User ID
 
         Returns:
-            Dict with success status and file_id or error
+            Dict with success status and the prepared document_data/file_data, or error
         """
+        claimed_hash: Optional[str] = None
         try:
-            # Read file content
-            content = await file.read()
-            await file.seek(0)  # Reset file pointer
+            # Reject oversized uploads before reading anything when the size is known
+            if file.size is not None:
+                size_error = self.validator.check_file_size(file.size)
+                if size_error:
+                    return {"success": False, "error": size_error}
+
+            # Read file content in chunks, hashing as we go and stopping early
+            # if the upload turns out to exceed the size limit
+            hasher = new_content_hasher()
+            # Rows created before BLAKE3 hold SHA-256 digests; match those too until backfilled
+            legacy_hasher = new_legacy_content_hasher() if settings.legacy_sha256_dedup else None
+            parts = []
+            bytes_read = 0
+            while chunk := await file.read(UPLOAD_READ_CHUNK_SIZE):
+                bytes_read += len(chunk)
+                size_error = self.validator.check_file_size(bytes_read)
+                if size_error:
+                    return {"success": False, "error": size_error}
+                if len(chunk) >= HASH_OFFLOAD_THRESHOLD:
+                    # Hash large chunks in a worker thread so other uploads keep moving
+                    await asyncio.to_thread(_update_hashers, chunk, hasher, legacy_hasher)
+                else:
+                    _update_hashers(chunk, hasher, legacy_hasher)
+                parts.append(chunk)
+
+            content = b"".join(parts)
+            del parts
 
             # Validate file
             validation_result = self.validator.validate_file(file.filename, content)
             if not validation_result.is_valid:
                 return {"success": False, "error": "; ".join(validation_result.errors)}
 
-            # Calculate content hash for deduplication
-            content_hash = calculate_content_hash(content)
-
-            # Check for existing document with same hash
-            client = await db.get_supabase_client()
+            # Content hash for deduplication, computed while reading
+            content_hash = hasher.hexdigest()
+            legacy_hash = legacy_hasher.hexdigest() if legacy_hasher is not None else None
 
-            # Check 1: Documents that are fully processed and in the library
-            existing_documents = (
-                await client.table("documents")
-                .select("id, title")
-                .eq("content_hash", content_hash)
-                .eq("is_deleted", False)  # Only check non-deleted documents
-                .execute()
-            )
+            # Recently seen hashes are rejected without a database round-trip
+            cached_duplicate = self._get_cached_duplicate(content_hash)
+            if cached_duplicate:
+                return cached_duplicate
 
-            # Check 2: Processing files that are currently being processed successfully
-            # Only include active processing states and review states
-            existing_processing = (
-                await client.table("processing_files")
-                .select("id, original_filename, status")
-                .eq("content_hash", content_hash)
-                .in_(
-                    "status",
-                    [
-                        "uploading",
-                        "extracting",
-                        "analyzing_metadata",
-                        "generating_embeddings",
-                        "review_pending",
-                        "approved",
-                    ],
-                )
-                .execute()
-            )
-
-            if existing_documents.data:
-                document = existing_documents.data[0]
-                return {
-                    "success": False,
-                    "error": f"Document already exists in library: {document.get('title', 'Untitled')}",
-                    "is_duplicate": True,
-                    "existing_document_id": document["id"],
-                }
-
-            if existing_processing.data:
-                processing_file = existing_processing.data[0]
+            # Identical files in flight (e.g. the same PDF dropped twice in one batch) are
+            # rejected before touching storage; the claim is held until records exist
+            inflight = self._inflight_hashes.get(content_hash)
+            if inflight is not None:
+                _, sibling_filename = inflight
                 return {
                     "success": False,
-                    "error": f"Document is already being processed: {processing_file.get('original_filename', 'Unknown')} (Status: {processing_file.get('status', 'unknown')})",
+                    "error": f"Duplicate of {sibling_filename}, which is already being uploaded",
                     "is_duplicate": True,
-                    "existing_processing_file_id": processing_file["id"],
                 }
+            self._inflight_hashes[content_hash] = (job_id, file.filename)
+            claimed_hash = content_hash
 
             # Generate unique storage path
             file_id = str(uuid4())
             safe_filename = generate_safe_filename(file.filename, file_id)
             storage_path = f"uploads/{safe_filename}"
 
-            # Upload to Supabase Storage
+            # Dedup is rarely a hit, so upload to storage speculatively while the
+            # duplicate check runs and undo the upload if it turns out to be one
             client = await db.get_supabase_client()
-            upload_result = await client.storage.from_("documents").upload(
-                storage_path, content, {"content-type": file.content_type}
+            duplicate, upload_result = await asyncio.gather(
+                self._find_duplicate(content_hash, legacy_hash),
+                client.storage.from_("documents").upload(
+                    storage_path, content, {"content-type": file.content_type}
+                ),
+                return_exceptions=True,
+            )
+
+            upload_failed = isinstance(upload_result, Exception) or (
+                hasattr(upload_result, "error") and upload_result.error
             )
+            if (isinstance(duplicate, Exception) or duplicate) and not upload_failed:
+                await self.delete_file(storage_path)
 
-            if hasattr(upload_result, "error") and upload_result.error:
+            if isinstance(duplicate, Exception):
+                raise duplicate
+            if duplicate:
+                return duplicate
+
+            if isinstance(upload_result, Exception):
+                raise upload_result
+            if upload_failed:
                 logger.error(f"Storage upload failed: {upload_result.error}")
                 return {"success": False, "error": "Storage upload failed"}
 
-            # Create document record immediately with basic information
+            # One timestamp shared by both records
+            created_at = datetime.now(timezone.utc).isoformat()
+            content_hash_bytea = content_hash_to_bytea(content_hash)
+
+            # Document record with basic information
             document_data = {
                 "title": file.filename,  # Use filename as initial title
                 "filename": safe_filename,
                 "original_filename": file.filename,
                 "doc_type": "other",  # Default type, will be updated by AI
                 "doc_category": "Other",  # Default category, will be updated by AI
-                "content_hash": content_hash,
+                "content_hash": content_hash_bytea,
                 "file_size": len(content),
                 "mime_type": file.content_type,
                 "storage_path": storage_path,
@@ -237,37 +351,29 @@ class FileService:
                 "is_deleted": False,
                 "is_archived": False,
                 "uploaded_by": user_id,
-                "created_at": datetime.utcnow().isoformat(),
+                "created_at": created_at,
             }
 
-            document_result = await client.table("documents").insert(document_data).execute()
-            document_id = document_result.data[0]["id"]
-
-            # Create processing file record linked to the document
+            # Processing file record; document_id is filled in after the bulk document insert
             file_data = {
                 "batch_id": job_id,
-                "document_id": document_id,  # Link to the document immediately
                 "original_filename": file.filename,
                 "stored_path": storage_path,
                 "file_size": len(content),
                 "mime_type": file.content_type,
-                "content_hash": content_hash,
-                "status": FileStatus.UPLOADED.value,
+                "content_hash": content_hash_bytea,
+                "status": _FILE_UPLOADED,
                 "retry_count": 0,
-                "created_at": datetime.utcnow().isoformat(),
+                "created_at": created_at,
             }
 
-            file_result = await client.table("processing_files").insert(file_data).execute()
-            file_record_id = file_result.data[0]["id"]
-
-            logger.info(
-                f"Successfully uploaded file {file.filename} with processing ID {file_record_id} and document ID {document_id}"
-            )
-
+            # Stored files keep their claim until _upload_batch_files has created records
+            claimed_hash = None
             return {
                 "success": True,
-                "file_id": file_record_id,
-                "document_id": document_id,
+                "document_data": document_data,
+                "file_data": file_data,
+                "content_hash": content_hash,
                 "storage_path": storage_path,
             }
 
@@ -275,6 +381,190 @@ class FileService:
             logger.error(f"Error processing file {file.filename}: {e}")
             return {"success": False, "error": f"Processing error: {str(e)}"}
 
+        finally:
+            # A file that won't be stored must not block re-uploads of the same content
+            if claimed_hash is not None:
+                self._release_hash(claimed_hash, job_id)
+
+    async def _find_duplicate(
+        self, content_hash: str, legacy_hash: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Look up an existing library document or in-flight processing file by content hash.
+
+        Args:
+            content_hash: Hex content hash of the uploaded file
+            legacy_hash: Hex SHA-256 digest of the file, to match rows not yet re-hashed
+
+        Returns:
+            Duplicate error response if a match exists, None otherwise
+        """
+        # One RPC covers both the documents and processing_files tables
+        client = await db.get_supabase_client()
+        existing = await client.rpc(
+            "check_content_hash",
+            {
+                "h": content_hash_to_bytea(content_hash),
+                "legacy_h": content_hash_to_bytea(legacy_hash) if legacy_hash else None,
+            },
+        ).execute()
+        if not existing.data:
+            return None
+
+        match = existing.data[0]
+        if match["source"] == "document":
+            duplicate = {
+                "success": False,
+                "error": f"Document already exists in library: {match.get('title') or 'Untitled'}",
+                "is_duplicate": True,
+                "existing_document_id": match["id"],
+            }
+            # Only library matches are cached: a file still in the pipeline may fail and have
+            # its document deleted, and a re-upload must then be accepted straight away
+            self._cache_duplicate(content_hash, duplicate)
+            return duplicate
+
+        return {
+            "success": False,
+            "error": f"Document is already being processed: {match.get('title') or 'Unknown'} (Status: {match.get('status') or 'unknown'})",
+            "is_duplicate": True,
+            "existing_processing_file_id": match["id"],
+        }
+
+    async def _insert_file_records(
+        self, prepared_files: List[Dict[str, Any]]
+    ) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """
+        Insert document and processing file rows for a batch of stored files.
+
+        Rows go in with one bulk insert per table. If that fails, each file is retried on its
+        own so one bad row doesn't fail the rest of the upload.
+
+        Args:
+            prepared_files: Successful results from _process_single_file
+
+        Returns:
+            Tuple of (processing file IDs of inserted files, failed file details)
+        """
+        try:
+            return await self._insert_file_record_rows(prepared_files), []
+        except Exception as e:
+            if len(prepared_files) == 1:
+                return [], [await self._discard_prepared_file(prepared_files[0], e)]
+            logger.warning(
+                f"⚠️ Bulk insert of {len(prepared_files)} file records failed, "
+                f"retrying per file: {e}"
+            )
+
+        results = await asyncio.gather(
+            *(self._insert_file_record_rows([prepared]) for prepared in prepared_files),
+            return_exceptions=True,
+        )
+        uploaded_files = []
+        failed_files = []
+        for prepared, result in zip(prepared_files, results):
+            if isinstance(result, Exception):
+                failed_files.append(await self._discard_prepared_file(prepared, result))
+            else:
+                uploaded_files.extend(result)
+        return uploaded_files, failed_files
+
+    async def _insert_file_record_rows(self, prepared_files: List[Dict[str, Any]]) -> List[str]:
+        """
+        Insert the document and processing file rows of stored files with one insert per table.
+
+        If the processing_files insert fails, the documents rows just inserted are deleted
+        again, so check_content_hash doesn't report the files as already in the library.
+
+        Args:
+            prepared_files: Successful results from _process_single_file
+
+        Returns:
+            Processing file IDs, in the same order as prepared_files
+        """
+        client = await db.get_supabase_client()
+
+        document_result = (
+            await client.table("documents")
+            .insert([prepared["document_data"] for prepared in prepared_files])
+            .execute()
+        )
+
+        # PostgREST returns inserted rows in request order, so IDs zip back positionally
+        file_rows = [
+            {**prepared["file_data"], "document_id": document["id"]}
+            for prepared, document in zip(prepared_files, document_result.data)
+        ]
+        try:
+            file_result = await client.table("processing_files").insert(file_rows).execute()
+        except Exception:
+            await (
+                client.table("documents")
+                .delete(returning="minimal")
+                .in_("id", [file_row["document_id"] for file_row in file_rows])
+                .execute()
+            )
+            raise
+
+        for file_row, file_record in zip(file_rows, file_result.data):
+            logger.info(
+                f"Successfully uploaded file {file_row['original_filename']} with processing ID {file_record['id']} and document ID {file_row['document_id']}"
+            )
+
+        return [file_record["id"] for file_record in file_result.data]
+
+    async def _discard_prepared_file(
+        self, prepared: Dict[str, Any], error: Exception
+    ) -> Dict[str, Any]:
+        """
+        Remove the stored object of a file whose database records could not be created.
+
+        Args:
+            prepared: Result from _process_single_file
+            error: Error raised while inserting the file's records
+
+        Returns:
+            Failed file details for the upload response
+        """
+        filename = prepared["file_data"]["original_filename"]
+        logger.error(f"❌ Failed to create records for {filename}: {error}")
+        self._release_hash(prepared["content_hash"], prepared["file_data"]["batch_id"])
+        await self.delete_file(prepared["storage_path"])
+        return {"filename": filename, "error": f"Processing error: {str(error)}"}
+
+    def _release_hashes(self, job_id: str) -> None:
+        """Release the in-flight content hash claims held by a processing job."""
+        released = [h for h, (owner, _) in self._inflight_hashes.items() if owner == job_id]
+        for content_hash in released:
+            del self._inflight_hashes[content_hash]
+
+    def _release_hash(self, content_hash: str, job_id: str) -> None:
+        """Release one in-flight content hash claim, if the processing job still holds it."""
+        claim = self._inflight_hashes.get(content_hash)
+        if claim is not None and claim[0] == job_id:
+            del self._inflight_hashes[content_hash]
+
+    def _get_cached_duplicate(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """Return the cached duplicate response for a content hash, if still fresh."""
+        cached = self._hash_cache.get(content_hash)
+        if cached is None:
+            return None
+
+        cached_at, duplicate = cached
+        if time.monotonic() - cached_at > self.hash_cache_ttl:
+            del self._hash_cache[content_hash]
+            return None
+
+        self._hash_cache.move_to_end(content_hash)
+        return duplicate
+
+    def _cache_duplicate(self, content_hash: str, duplicate: Dict[str, Any]) -> None:
+        """Remember a content hash as a duplicate, evicting the least recently used entry."""
+        self._hash_cache[content_hash] = (time.monotonic(), duplicate)
+        self._hash_cache.move_to_end(content_hash)
+        if len(self._hash_cache) > self.hash_cache_size:
+            self._hash_cache.popitem(last=False)
+
     async def _start_background_processing(self, file_ids: List[str]):
         """
         Start background processing for uploaded files.
@@ -284,21 +574,18 @@ class FileService:
         """
         logger.info(f"Starting background processing for {len(file_ids)} files")
 
-        # Queue each file for text extraction
-        for file_id in file_ids:
-            try:
-                await self.processing_service.queue_text_extraction(file_id)
-            except Exception as e:
-                logger.error(f"Failed to queue file {file_id} for processing: {e}")
+        # Queue all files for text extraction in one go
+        if await self.processing_service.queue_text_extraction_bulk(file_ids):
+            return
+
+        logger.error(f"Failed to queue {len(file_ids)} files for processing")
 
-                # Mark file as failed
-                client = await db.get_supabase_client()
-                await client.table("processing_files").update(
-                    {
-                        "status": FileStatus.EXTRACTION_FAILED.value,
-                        "error_message": f"Failed to queue for processing: {str(e)}",
-                    }
-                ).eq("id", file_id).execute()
+        # Mark all files as failed in a single update
+        await self.update_files_status(
+            file_ids,
+            FileStatus.EXTRACTION_FAILED,
+            error_message="Failed to queue for processing",
+        )
 
     async def get_file_content(self, storage_path: str) -> bytes:
         """
@@ -349,11 +636,7 @@ class FileService:
             True if successful, False otherwise
         """
         try:
-            update_data = {
-                "status": status.value,
-                "updated_at": datetime.utcnow().isoformat(),
-                **kwargs,
-            }
+            update_data = {"status": status.value, **kwargs}
 
             client = await db.get_supabase_client()
             await client.table("processing_files").update(update_data).eq("id", file_id).execute()
@@ -364,3 +647,31 @@ class FileService:
         except Exception as e:
             logger.error(f"Failed to update file {file_id} status: {e}")
             return False
+
+    async def update_files_status(self, file_ids: List[str], status: FileStatus, **kwargs) -> bool:
+        """
+        Update processing status for several files with one bulk UPDATE.
+
+        Args:
+            file_ids: Processing file IDs
+            status: New status
+            **kwargs: Additional fields to update
+
+        Returns:
+            True if successful, False otherwise
+        """
+        if not file_ids:
+            return True
+
+        try:
+            update_data = {"status": status.value, **kwargs}
+
+            client = await db.get_supabase_client()
+            await client.table("processing_files").update(update_data).in_("id", file_ids).execute()
+
+            logger.debug(f"Updated {len(file_ids)} files to status {status.value}")
+            return True
+
+        except Exception as e:
+            logger.error(f"Failed to update status for {len(file_ids)} files: {e}")
+            return False
@@ -3,32 +3,184 @@ LangChain-based document processing service.
 Replaces the complex custom chunking and embedding logic with battle-tested LangChain components.
 """
 
+import asyncio
+import io
 import logging
-from typing import Any, Dict, List, Optional
-
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from functools import lru_cache
+from itertools import repeat
+from typing import Any, Dict, Iterator, List, Optional
+
+import orjson
+import tiktoken
 from langchain.schema import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import SupabaseVectorStore
 from langchain_openai import OpenAIEmbeddings
+from supabase import AsyncClient  # type: ignore
 
 from app.core.config import settings
 from app.core.database import db
+from app.core.http_clients import openai_http_client
 from app.core.logging_utils import processing_logger
 from app.models.enums import FileStatus
 
 logger = logging.getLogger(__name__)
 
 
+# PDFium is not thread-safe; documents are parsed in worker threads one at a time
+_PDFIUM_LOCK = threading.Lock()
+
+# pdfplumber fallback: pages per worker-process shard (amortizes re-opening the PDF)
+PDFPLUMBER_PAGES_PER_SHARD = 25
+_pdf_process_pool: Optional[ProcessPoolExecutor] = None
+_PDF_PROCESS_POOL_LOCK = threading.Lock()
+
+# Near-duplicate detection: chunks equal up to case and spacing share one embedding. Numbers
+# are never folded: in wage tables, discount rates and life tables they are the content
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+class _TextLengthLimitExceeded(ValueError):
+    """Raised when a document's extracted text exceeds max_text_length."""
+
+
+def _iter_page_texts_pdfium(file_content: bytes) -> Iterator[str]:
+    """Yield the text of each PDF page using PDFium (fast C++ text extraction)."""
+    import pypdfium2 as pdfium
+
+    with _PDFIUM_LOCK:
+        pdf = pdfium.PdfDocument(file_content)
+        try:
+            for page in pdf:
+                textpage = page.get_textpage()
+                try:
+                    # PDFium separates lines with CRLF; normalise to match pdfplumber output
+                    yield textpage.get_text_range().replace("\r\n", "\n")
+                finally:
+                    textpage.close()
+                    page.close()
+        finally:
+            pdf.close()
+
+
+@lru_cache(maxsize=1)
+def _get_embedding_encoding() -> tiktoken.Encoding:
+    """Get the tokenizer for the configured embedding model, loaded once per process."""
+    try:
+        return tiktoken.encoding_for_model(settings.embedding_model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def _count_tokens(texts: List[str]) -> List[int]:
+    """Count embedding-model tokens for each text (tiktoken encodes the batch in parallel)."""
+    encoded = _get_embedding_encoding().encode_batch(texts, disallowed_special=())
+    return [len(tokens) for tokens in encoded]
+
+
+def _to_pgvector(embedding: List[float]) -> str:
+    """Serialize an embedding as a pgvector text literal using orjson's fast float formatting."""
+    # PostgREST then JSON-encodes one string per row instead of 1536 Python floats
+    return orjson.dumps(embedding).decode()
+
+
+def _near_duplicate_key(text: str) -> str:
+    """Normalize chunk text so boilerplate differing only in case or spacing matches."""
+    return _WHITESPACE_RE.sub(" ", text.lower()).strip()
+
+
+def _get_pdf_process_pool() -> ProcessPoolExecutor:
+    """Return the shared process pool used for pdfplumber extraction, creating it on first use."""
+    global _pdf_process_pool
+    with _PDF_PROCESS_POOL_LOCK:
+        if _pdf_process_pool is None:
+            # The pool is created from a worker thread; forking a threaded process can copy
+            # held locks into the child, so workers start from a clean forkserver/spawn process
+            start_method = (
+                "forkserver"
+                if "forkserver" in multiprocessing.get_all_start_methods()
+                else "spawn"
+            )
+            _pdf_process_pool = ProcessPoolExecutor(
+                max_workers=min(os.cpu_count() or 1, settings.max_concurrent_extractions),
+                mp_context=multiprocessing.get_context(start_method),
+            )
+        return _pdf_process_pool
+
+
+def shutdown_pdf_process_pool() -> None:
+    """Shut down the pdfplumber process pool, if it was started. Call on application shutdown."""
+    global _pdf_process_pool
+    with _PDF_PROCESS_POOL_LOCK:
+        if _pdf_process_pool is not None:
+            _pdf_process_pool.shutdown(cancel_futures=True)
+            _pdf_process_pool = None
+
+
+def _extract_page_range_pdfplumber(pdf_source: Any, start: int, stop: int) -> List[str]:
+    """Extract the text of pages [start, stop) with pdfplumber (runs in a worker process)."""
+    import pdfplumber
+
+    with pdfplumber.open(pdf_source) as pdf:
+        return [page.extract_text() or "" for page in pdf.pages[start:stop]]
+
+
+def _iter_page_texts_pdfplumber(file_content: bytes) -> Iterator[str]:
+    """Yield the text of each PDF page using pdfplumber (slower, kept as a fallback)."""
+    import pdfplumber
+
+    with io.BytesIO(file_content) as pdf_buffer:
+        with pdfplumber.open(pdf_buffer) as pdf:
+            page_count = len(pdf.pages)
+
+    # pdfminer parsing is pure Python and GIL-bound, so large PDFs are sharded across processes
+    if page_count <= PDFPLUMBER_PAGES_PER_SHARD:
+        with io.BytesIO(file_content) as pdf_buffer:
+            yield from _extract_page_range_pdfplumber(pdf_buffer, 0, page_count)
+        return
+
+    # Shards open the PDF from a temporary file instead of each being sent a pickled copy
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as pdf_file:
+        pdf_file.write(file_content)
+        pdf_file.flush()
+
+        starts = range(0, page_count, PDFPLUMBER_PAGES_PER_SHARD)
+        stops = [min(start + PDFPLUMBER_PAGES_PER_SHARD, page_count) for start in starts]
+        shard_texts = _get_pdf_process_pool().map(
+            _extract_page_range_pdfplumber, repeat(pdf_file.name), starts, stops
+        )
+        for texts in shard_texts:
+            yield from texts
+
+
 class LangChainDocumentProcessor:
     """Simplified document processor using LangChain components."""
 
+    # Text splitter with safe, proven settings; stateless, so built once and shared
+    text_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=settings.chunk_size,
+        chunk_overlap=settings.chunk_overlap,
+        length_function=len,
+        separators=["\n\n", "\n", " ", ""],  # Standard separators
+    )
+
     def __init__(self):
         self.embeddings = None
         try:
             if settings.openai_api_key and settings.openai_api_key.strip():
                 try:
+                    # Shared HTTP/2 pool: concurrent embedding batches multiplex over warm
+                    # connections instead of paying a TLS handshake per request
                     self.embeddings = OpenAIEmbeddings(
-                        openai_api_key=settings.openai_api_key, model=settings.embedding_model
+                        openai_api_key=settings.openai_api_key,
+                        model=settings.embedding_model,
+                        http_async_client=openai_http_client,
                     )
                     logger.info("LangChain OpenAI embeddings initialized successfully")
                 except Exception as e:
@@ -40,18 +192,29 @@ class LangChainDocumentProcessor:
             logger.error(f"Critical error initializing LangChain processor: {e}")
             self.embeddings = None
 
-        # Initialize text splitter with safe, proven settings
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=settings.chunk_size,
-            chunk_overlap=settings.chunk_overlap,
-            length_function=len,
-            separators=["\n\n", "\n", " ", ""],  # Standard separators
-        )
+        # Embedding requests: OpenAI accepts large batches; bound parallelism for rate limits
+        self.embedding_batch_size = 500
+        self.max_embedding_batch_tokens = 300_000  # OpenAI per-request token limit
+        self.max_concurrent_embedding_batches = 5  # Concurrent chunk inserts per file
+        # Embedding requests in flight across all files, so concurrent files share one budget
+        self._embedding_semaphore = asyncio.Semaphore(settings.max_concurrent_embedding_requests)
+        self.embedding_cache_lookup_size = 100
+        self.chunk_insert_batch_size = 1000  # Rows per PostgREST insert for very large documents
 
         logger.info(
             f"LangChain processor initialized with chunk_size={settings.chunk_size}, chunk_overlap={settings.chunk_overlap}"
         )
 
+    def warm_up(self) -> None:
+        """Load the embedding tokenizer so the first file after boot doesn't pay for it."""
+        if not self.embeddings:
+            return
+        try:
+            # tiktoken caches encodings per process, so this also warms OpenAIEmbeddings
+            _get_embedding_encoding().encode("warmup")
+        except Exception as e:
+            logger.warning(f"Failed to warm up embedding tokenizer: {e}")
+
     async def process_pdf_file(self, file_id: str, file_path: str) -> Dict[str, Any]:
         """
         Process a PDF file using LangChain components.
@@ -69,20 +232,13 @@ class LangChainDocumentProcessor:
 
         try:
             # Step 1: Get file content from Supabase storage (in-memory processing)
-            import io
-
-            import pdfplumber
-
-            from app.core.database import db
+            from app.utils.file_utils import count_words
 
             processing_logger.log_step(
                 "loading_file_content", file_id=file_id, storage_path=file_path
             )
 
-            # Update status to extracting text
-            await self._update_file_status(file_id, FileStatus.EXTRACTING_TEXT)
-
-            # Get file content from Supabase storage
+            # One client for the whole file: download, chunk insert and final update
             client = await db.get_supabase_client()
 
             try:
@@ -105,40 +261,29 @@ class LangChainDocumentProcessor:
                 "file_content_loaded", file_id=file_id, size=len(file_content)
             )
 
-            # Step 2: Process PDF directly from memory using pdfplumber
+            # Step 2: Process PDF directly from memory (PDFium, with pdfplumber as fallback)
             processing_logger.log_step("pdf_memory_processing_start", file_id=file_id)
 
-            documents = []
-            with io.BytesIO(file_content) as pdf_buffer:
-                with pdfplumber.open(pdf_buffer) as pdf:
-                    full_text_parts = []
-                    for page_num, page in enumerate(pdf.pages):
-                        page_text = page.extract_text()
-                        if page_text:
-                            full_text_parts.append(page_text)
-                            # Create LangChain-compatible document for each page
-                            doc = Document(
-                                page_content=page_text,
-                                metadata={"page": page_num + 1, "source": file_path},
-                            )
-                            documents.append(doc)
-
-                    processing_logger.log_step(
-                        "pdf_memory_processing_complete",
-                        file_id=file_id,
-                        pages_processed=len(pdf.pages),
-                        documents_created=len(documents),
-                    )
+            # Parsing is CPU-bound; run it in a worker thread so other files' I/O keeps moving
+            documents = await asyncio.to_thread(
+                self._extract_page_documents, file_content, file_id, file_path
+            )
+
+            processing_logger.log_step(
+                "pdf_memory_processing_complete",
+                file_id=file_id,
+                documents_created=len(documents),
+            )
 
-            # Extract text from all pages
-            full_text = "\n".join([doc.page_content for doc in documents])
+            # Extract text from all pages (join copies each page once; the page strings are shared)
+            full_text = "\n".join(doc.page_content for doc in documents)
             text_length = len(full_text)
 
             # Calculate metadata metrics
             page_count = len(documents)
-            word_count = len(full_text.split())
-            char_count = len(full_text)
-            preview_text = full_text[:1500] + "..." if len(full_text) > 1500 else full_text
+            word_count = count_words(full_text)
+            char_count = text_length
+            preview_text = full_text[:1500] + "..." if text_length > 1500 else full_text
 
             processing_logger.log_step(
                 "pdf_loading_complete",
@@ -148,77 +293,69 @@ class LangChainDocumentProcessor:
                 word_count=word_count,
             )
 
-            # Step 2: Update processing file with extracted text and metadata
-            client = await db.get_supabase_client()
-            await client.table("processing_files").update(
-                {
-                    "extracted_text": full_text,
-                    "page_count": page_count,
-                    "word_count": word_count,
-                    "char_count": char_count,
-                    "preview_text": preview_text,
-                    "status": FileStatus.ANALYZING_METADATA.value,
-                }
-            ).eq("id", file_id).execute()
-
-            # Step 3: Split documents using RecursiveCharacterTextSplitter
+            # Step 3: Split pages using RecursiveCharacterTextSplitter (off the event loop)
             processing_logger.log_step("text_splitting_start", file_id=file_id)
-            chunks = self.text_splitter.split_documents(documents)
+            chunk_texts = await asyncio.to_thread(self._split_pages, documents)
 
             processing_logger.log_step(
                 "text_splitting_complete",
                 file_id=file_id,
-                total_chunks=len(chunks),
-                avg_chunk_size=sum(len(chunk.page_content) for chunk in chunks) / len(chunks)
-                if chunks
+                total_chunks=len(chunk_texts),
+                avg_chunk_size=sum(len(text) for text in chunk_texts) / len(chunk_texts)
+                if chunk_texts
                 else 0,
             )
 
             # Step 4: Generate and store embeddings if OpenAI is available
-            if self.embeddings and chunks:
+            if self.embeddings and chunk_texts:
                 processing_logger.log_step(
-                    "embedding_generation_start", file_id=file_id, chunk_count=len(chunks)
+                    "embedding_generation_start", file_id=file_id, chunk_count=len(chunk_texts)
                 )
-                await self._update_file_status(file_id, FileStatus.GENERATING_EMBEDDINGS)
 
                 # Generate embeddings and store in database
                 # We need to manually handle this since LangChain's SupabaseVectorStore doesn't support async
-                client = await db.get_supabase_client()
+                from app.utils.file_utils import calculate_content_hash
 
-                # Generate embeddings for all chunks
-                chunk_texts = [chunk.page_content for chunk in chunks]
-                embeddings_list = self.embeddings.embed_documents(chunk_texts)
+                # Generate embeddings for all chunks, reusing cached vectors for known content.
+                # Token counts are exact (embedding-model tokenizer) and serve both the embedding
+                # batch packing and the stored token_count
+                chunk_hashes = [
+                    calculate_content_hash(text.encode("utf-8")) for text in chunk_texts
+                ]
+                token_counts = await asyncio.to_thread(_count_tokens, chunk_texts)
+                embeddings_list = await self._embed_texts_deduplicated(
+                    file_id, chunk_texts, chunk_hashes, token_counts
+                )
 
                 # Prepare chunk data for insertion
-                from app.utils.file_utils import calculate_content_hash
-
                 chunks_data = []
-                for i, (chunk, embedding) in enumerate(zip(chunks, embeddings_list)):
-                    chunk_content = chunk.page_content
+                for i, (chunk_content, embedding) in enumerate(zip(chunk_texts, embeddings_list)):
                     chunks_data.append(
                         {
                             "processing_file_id": file_id,  # Use correct field name
                             "chunk_index": i,
                             "content": chunk_content,  # Use standardized content field
-                            "content_hash": calculate_content_hash(chunk_content.encode("utf-8")),
-                            "embedding": embedding,
-                            "token_count": len(chunk_content.split()),  # Rough token count
-                            # document_id is nullable and will be set later when processing completes
+                            "content_hash": chunk_hashes[i],
+                            "embedding": _to_pgvector(embedding),
+                            "token_count": token_counts[i],
+                            # document_id is filled in from processing_files by an insert trigger
                         }
                     )
 
-                # Insert chunks into database
-                await client.table("document_chunks").insert(chunks_data).execute()
-
-                # Update chunk count in processing file
-                await client.table("processing_files").update({"chunk_count": len(chunks)}).eq(
-                    "id", file_id
-                ).execute()
+                # Clear chunks left by an interrupted earlier run of this file so a resumed
+                # file isn't indexed twice, then insert chunks into database
+                await (
+                    client.table("document_chunks")
+                    .delete(returning="minimal")
+                    .eq("processing_file_id", file_id)
+                    .execute()
+                )
+                await self._insert_chunks(client, chunks_data)
 
                 processing_logger.log_step(
                     "embedding_generation_complete",
                     file_id=file_id,
-                    chunks_embedded=len(chunks),
+                    chunks_embedded=len(chunk_texts),
                     embedding_dimension=1536,  # OpenAI default
                 )
             else:
@@ -228,14 +365,25 @@ class LangChainDocumentProcessor:
                     reason="No OpenAI API key" if not self.embeddings else "No chunks",
                 )
 
-            # Step 5: Mark as ready for review
-            await self._update_file_status(file_id, FileStatus.REVIEW_PENDING)
+            # Step 5: Save extracted text, metrics and chunk count in a single write. The file
+            # moves on to metadata analysis; only the metadata stage marks it ready for review
+            await client.table("processing_files").update(
+                {
+                    "extracted_text": full_text,
+                    "page_count": page_count,
+                    "word_count": word_count,
+                    "char_count": char_count,
+                    "preview_text": preview_text,
+                    "chunk_count": len(chunk_texts),
+                    "status": FileStatus.ANALYZING_METADATA.value,
+                }
+            ).eq("id", file_id).execute()
 
             processing_logger.log_step(
                 "langchain_processing_complete",
                 file_id=file_id,
                 text_length=text_length,
-                chunk_count=len(chunks),
+                chunk_count=len(chunk_texts),
                 success=True,
             )
 
@@ -243,9 +391,10 @@ class LangChainDocumentProcessor:
                 "success": True,
                 "file_id": file_id,
                 "text_length": text_length,
-                "chunk_count": len(chunks),
+                "chunk_count": len(chunk_texts),
                 "embedding_dimension": 1536 if self.embeddings else 0,
-                # Include text metrics to pass through pipeline
+                # Include text and metrics to pass through pipeline without re-reading them
+                "extracted_text": full_text,
                 "preview_text": preview_text,
                 "page_count": page_count,
                 "word_count": word_count,
@@ -257,6 +406,283 @@ class LangChainDocumentProcessor:
             await self._update_file_status(file_id, FileStatus.EXTRACTION_FAILED, error=str(e))
             return {"success": False, "file_id": file_id, "error": str(e)}
 
+    def _extract_page_documents(
+        self, file_content: bytes, file_id: str, file_path: str
+    ) -> List[Document]:
+        """Extract per-page documents with PDFium, falling back to pdfplumber on failure."""
+        # The page iterators are closed as soon as extraction stops, so an early stop releases
+        # _PDFIUM_LOCK and the pdfplumber temp file straight away rather than on garbage collection
+        try:
+            with closing(_iter_page_texts_pdfium(file_content)) as page_texts:
+                return self._build_page_documents(page_texts, file_id, file_path)
+        except _TextLengthLimitExceeded:
+            raise  # The document is too long whichever parser reads it
+        except Exception as e:
+            processing_logger.log_step(
+                "pdfium_extraction_failed", file_id=file_id, error=str(e), fallback="pdfplumber"
+            )
+            with closing(_iter_page_texts_pdfplumber(file_content)) as page_texts:
+                return self._build_page_documents(page_texts, file_id, file_path)
+
+    def _split_pages(self, documents: List[Document]) -> List[str]:
+        """Split each page into chunk texts, in page order, without per-chunk Document copies."""
+        return [
+            chunk_text
+            for document in documents
+            for chunk_text in self.text_splitter.split_text(document.page_content)
+        ]
+
+    def _build_page_documents(
+        self, page_texts: Iterator[str], file_id: str, file_path: str
+    ) -> List[Document]:
+        """
+        Wrap extracted page texts in LangChain documents, failing fast past max_text_length.
+
+        Args:
+            page_texts: Lazily extracted text of each page, in page order
+            file_id: Processing file ID (for logging)
+            file_path: Storage path recorded as the document source
+
+        Returns:
+            One document per page that has text
+
+        Raises:
+            _TextLengthLimitExceeded: If the text exceeds max_text_length. The file is failed
+                rather than indexed and sent to review with its text silently truncated.
+        """
+        documents = []
+        extracted_chars = 0
+        for page_num, page_text in enumerate(page_texts):
+            # Stop early rather than extracting the rest of an oversized document
+            if extracted_chars > settings.max_text_length:
+                processing_logger.log_step(
+                    "text_length_limit_reached",
+                    file_id=file_id,
+                    pages_extracted=page_num,
+                    max_text_length=settings.max_text_length,
+                )
+                raise _TextLengthLimitExceeded(
+                    f"Document text too long: more than {settings.max_text_length} characters "
+                    f"in the first {page_num} pages"
+                )
+
+            if page_text:
+                extracted_chars += len(page_text)
+                # Create LangChain-compatible document for each page
+                documents.append(
+                    Document(
+                        page_content=page_text,
+                        metadata={"page": page_num + 1, "source": file_path},
+                    )
+                )
+        return documents
+
+    async def _insert_chunks(self, client: AsyncClient, chunks_data: List[Dict[str, Any]]):
+        """
+        Insert chunk rows with as few PostgREST calls as possible.
+
+        Documents up to chunk_insert_batch_size rows go in a single insert; larger ones are
+        split into batches of that size and inserted concurrently.
+
+        Args:
+            client: Supabase client
+            chunks_data: document_chunks rows to insert
+        """
+        batch_size = self.chunk_insert_batch_size
+        if len(chunks_data) <= batch_size:
+            await client.table("document_chunks").insert(chunks_data, returning="minimal").execute()
+            return
+
+        semaphore = asyncio.Semaphore(self.max_concurrent_embedding_batches)
+
+        async def insert_batch(batch: List[Dict[str, Any]]):
+            async with semaphore:
+                await client.table("document_chunks").insert(batch, returning="minimal").execute()
+
+        await asyncio.gather(
+            *(
+                insert_batch(chunks_data[start : start + batch_size])
+                for start in range(0, len(chunks_data), batch_size)
+            )
+        )
+
+    async def _embed_texts_deduplicated(
+        self,
+        file_id: str,
+        texts: List[str],
+        content_hashes: List[str],
+        token_counts: Optional[List[int]] = None,
+    ) -> List[List[float]]:
+        """
+        Embed texts once per near-duplicate group, sharing the vector across the group.
+
+        Repeated boilerplate (headers, footers, notices) would otherwise be looked up and
+        embedded once per occurrence.
+
+        Args:
+            file_id: Processing file ID (for logging)
+            texts: Texts to embed
+            content_hashes: Exact content hash of each text
+            token_counts: Embedding-model token count of each text, if already known
+
+        Returns:
+            Embeddings in the same order as texts
+        """
+        group_of: List[int] = []
+        group_index: Dict[str, int] = {}
+        representatives: List[int] = []
+        for i, text in enumerate(texts):
+            key = _near_duplicate_key(text)
+            if key not in group_index:
+                group_index[key] = len(representatives)
+                representatives.append(i)
+            group_of.append(group_index[key])
+
+        if len(representatives) < len(texts):
+            processing_logger.log_step(
+                "near_duplicate_chunks_skipped",
+                file_id=file_id,
+                total_chunks=len(texts),
+                unique_chunks=len(representatives),
+            )
+
+        group_embeddings = await self._embed_texts_cached(
+            [texts[i] for i in representatives],
+            [content_hashes[i] for i in representatives],
+            [token_counts[i] for i in representatives] if token_counts is not None else None,
+        )
+        return [group_embeddings[group] for group in group_of]
+
+    async def _embed_texts_cached(
+        self,
+        texts: List[str],
+        content_hashes: List[str],
+        token_counts: Optional[List[int]] = None,
+    ) -> List[List[float]]:
+        """
+        Embed texts, looking up the embedding_cache table first and only sending misses to OpenAI.
+
+        Args:
+            texts: Texts to embed
+            content_hashes: Content hash of each text, used as the cache key
+            token_counts: Embedding-model token count of each text, if already known
+
+        Returns:
+            Embeddings in the same order as texts
+        """
+        client = await db.get_supabase_client()
+        model = settings.embedding_model
+        unique_hashes = list(dict.fromkeys(content_hashes))
+
+        # Look up cached vectors in groups so the IN (...) filter stays within URL limits
+        cached: Dict[str, List[float]] = {}
+        lookup_size = self.embedding_cache_lookup_size
+        for i in range(0, len(unique_hashes), lookup_size):
+            result = await (
+                client.table("embedding_cache")
+                .select("content_hash, embedding")
+                .eq("model", model)
+                .in_("content_hash", unique_hashes[i : i + lookup_size])
+                .execute()
+            )
+            for row in result.data:
+                # pgvector columns come back from PostgREST as "[x,y,...]" strings
+                embedding = row["embedding"]
+                cached[row["content_hash"]] = (
+                    orjson.loads(embedding) if isinstance(embedding, str) else embedding
+                )
+
+        # Embed each distinct uncached text once (content hash -> index of its first text)
+        miss_indices: Dict[str, int] = {}
+        for i, content_hash in enumerate(content_hashes):
+            if content_hash not in cached:
+                miss_indices.setdefault(content_hash, i)
+
+        processing_logger.log_step(
+            "embedding_cache_lookup",
+            total_texts=len(texts),
+            cache_hits=len(unique_hashes) - len(miss_indices),
+            cache_misses=len(miss_indices),
+        )
+
+        if miss_indices:
+            miss_hashes = list(miss_indices)
+            new_embeddings = await self._embed_texts(
+                [texts[i] for i in miss_indices.values()],
+                (
+                    [token_counts[i] for i in miss_indices.values()]
+                    if token_counts is not None
+                    else None
+                ),
+            )
+            cached.update(zip(miss_hashes, new_embeddings))
+
+            await (
+                client.table("embedding_cache")
+                .upsert(
+                    [
+                        {
+                            "content_hash": content_hash,
+                            "model": model,
+                            "embedding": _to_pgvector(embedding),
+                        }
+                        for content_hash, embedding in zip(miss_hashes, new_embeddings)
+                    ],
+                    on_conflict="content_hash,model",
+                    returning="minimal",
+                )
+                .execute()
+            )
+
+        return [cached[content_hash] for content_hash in content_hashes]
+
+    async def _embed_texts(
+        self, texts: List[str], token_counts: Optional[List[int]] = None
+    ) -> List[List[float]]:
+        """
+        Embed texts with the async OpenAI path, sending batches concurrently.
+
+        Args:
+            texts: Texts to embed
+            token_counts: Embedding-model token count of each text; counted here if omitted
+
+        Returns:
+            Embeddings in the same order as texts
+        """
+        async def embed_batch(batch: List[str]) -> List[List[float]]:
+            async with self._embedding_semaphore:
+                return await self.embeddings.aembed_documents(batch)
+
+        # Batch texts of similar length together so no batch is dominated by a few long chunks
+        if token_counts is None:
+            token_counts = await asyncio.to_thread(_count_tokens, texts)
+        order = sorted(range(len(texts)), key=lambda i: token_counts[i])
+
+        # Greedily pack batches up to the item and per-request token limits
+        batches: List[List[str]] = []
+        batch: List[str] = []
+        batch_tokens = 0
+        for i in order:
+            if batch and (
+                len(batch) >= self.embedding_batch_size
+                or batch_tokens + token_counts[i] > self.max_embedding_batch_tokens
+            ):
+                batches.append(batch)
+                batch, batch_tokens = [], 0
+            batch.append(texts[i])
+            batch_tokens += token_counts[i]
+        if batch:
+            batches.append(batch)
+
+        batch_results = await asyncio.gather(*(embed_batch(batch) for batch in batches))
+
+        # Scatter embeddings back to the original text positions
+        embeddings: List[List[float]] = [[] for _ in texts]
+        sorted_embeddings = (embedding for batch in batch_results for embedding in batch)
+        for original_index, embedding in zip(order, sorted_embeddings):
+            embeddings[original_index] = embedding
+        return embeddings
+
     async def _update_file_status(
         self,
         file_id: str,
@@ -280,8 +706,6 @@ class LangChainDocumentProcessor:
 
     async def _update_document_processing_status(self, file_id: str, status: FileStatus):
         """Update document processing status based on processing file status."""
-        from datetime import datetime
-
         try:
             client = await db.get_supabase_client()
 
@@ -310,12 +734,9 @@ class LangChainDocumentProcessor:
             processing_status = status_map.get(status, "processing")
 
             # Update document with processing status
-            await client.table("documents").update(
-                {
-                    "processing_status": processing_status,
-                    "updated_at": datetime.utcnow().isoformat(),
-                }
-            ).eq("id", document_id).execute()
+            await client.table("documents").update({"processing_status": processing_status}).eq(
+                "id", document_id
+            ).execute()
 
             logger.info(f"Updated document {document_id} processing_status to {processing_status}")
 
@@ -4,10 +4,15 @@ Processing orchestration service for managing document processing workflows.
 
 import asyncio
 import logging
+import os
+import socket
 import time
-from datetime import datetime
-from typing import Any, Dict, List, Optional
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+from uuid import uuid4
 
+from app.core.config import settings
 from app.core.database import db
 from app.core.logging_utils import processing_logger
 from app.models.enums import BatchStatus, DocumentStatus, FileStatus
@@ -16,14 +21,82 @@ from app.services.langchain_processor import langchain_processor
 
 logger = logging.getLogger(__name__)
 
+# Status strings written on the hot path, resolved once rather than via Enum.value per call
+_UPLOADED = FileStatus.UPLOADED.value
+_QUEUED = FileStatus.QUEUED.value
+_REVIEW_PENDING = FileStatus.REVIEW_PENDING.value
+_EXTRACTION_FAILED = FileStatus.EXTRACTION_FAILED.value
+_APPROVED = FileStatus.APPROVED.value
+_REJECTED = FileStatus.REJECTED.value
+_BATCH_PROCESSING = BatchStatus.PROCESSING.value
+_BATCH_PROCESSING_COMPLETE = BatchStatus.PROCESSING_COMPLETE.value
+_BATCH_PARTIALLY_COMPLETED = BatchStatus.PARTIALLY_COMPLETED.value
+_BATCH_FAILED = BatchStatus.FAILED.value
+# Terminal file statuses counted by batch completion checks
+_TERMINAL_OK = frozenset({_REVIEW_PENDING, _APPROVED})
+_TERMINAL_FAIL = frozenset(
+    {_EXTRACTION_FAILED, FileStatus.ANALYSIS_FAILED.value, FileStatus.EMBEDDING_FAILED.value}
+)
+# Statuses a file holds after extraction stored its text and chunks, until the metadata stage ends
+_POST_EXTRACTION_STATUSES = frozenset(
+    {FileStatus.ANALYZING_METADATA.value, FileStatus.GENERATING_EMBEDDINGS.value}
+)
+# Statuses a file holds between being queued and reaching a terminal status
+_IN_FLIGHT_STATUSES = [_QUEUED, *sorted(_POST_EXTRACTION_STATUSES)]
+# Owner of this process's in-flight file claims. Unique per process, so workers sharing a host
+# and a restarted process never mistake another process's files for their own
+_PIPELINE_OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+
+# Large processing_files fields cleared once a file's data has moved to documents
+_PROCESSING_FILE_CLEANUP_FIELDS = {
+    "extracted_text": None,  # This is the largest field
+    "preview_text": None,  # Now stored in documents
+    "page_count": None,  # Now stored in documents
+    "word_count": None,  # Now stored in documents
+    "char_count": None,  # Now stored in documents
+    "chunk_count": None,  # Now stored in documents
+}
+
+# processing_files columns the pipeline stages read (never the large extracted_text)
+_PIPELINE_FILE_COLUMNS = "id, batch_id, document_id, stored_path, original_filename, status"
+
+# Text metrics produced by the LangChain stage and forwarded to the AI and documents steps
+_TEXT_METRIC_FIELDS = ("preview_text", "page_count", "word_count", "char_count", "chunk_count")
+
+
+def _claim_fields() -> Dict[str, str]:
+    """processing_files fields that claim a file for this process (see claim_in_flight_files)."""
+    return {"claimed_by": _PIPELINE_OWNER, "claimed_at": datetime.now(timezone.utc).isoformat()}
+
 
 class ProcessingService:
     """Orchestrates the document processing pipeline."""
 
+    # Each stage is bounded separately (shared by batches and upload-triggered queues) so a
+    # slow AI call never holds an extraction slot, and vice versa. The limits, queues and
+    # workers are class-level: the API routers and FileService each create a ProcessingService,
+    # and the bounds must hold across all of them.
+    _extraction_semaphore = asyncio.Semaphore(settings.max_concurrent_extractions)
+    _ai_semaphore = asyncio.Semaphore(settings.max_concurrent_ai_requests)
+    # Upload-triggered files flow through a two-stage pipeline (extraction -> metadata) so
+    # different files can occupy different stages. Queued IDs are cheap, so uploads never
+    # wait; the metadata queue is bounded so extracted text can't pile up behind slow AI calls.
+    _extraction_queue: "asyncio.Queue[str]" = asyncio.Queue()
+    _metadata_queue: asyncio.Queue = asyncio.Queue(maxsize=settings.max_concurrent_ai_requests * 2)
+    # Strong references to each stage's worker tasks so they can't be garbage-collected mid-run
+    _extraction_workers: List[asyncio.Task] = []
+    _metadata_workers: List[asyncio.Task] = []
+    # Loop the queues, semaphores and workers belong to (asyncio primitives bind to one loop)
+    _pipeline_loop: Optional[asyncio.AbstractEventLoop] = None
+    # Files still in the worker pipeline per batch, so only the batch's last file checks completion
+    _batch_remaining: Dict[str, int] = {}
+    # Files queued or running in this process, so repeat queue calls don't process twice
+    _inflight_files: Set[str] = set()
+    # Renews this process's file claims and takes over files whose owner stopped renewing
+    _claim_renewal_task: Optional[asyncio.Task] = None
+
     def __init__(self):
         self.ai_service = AIService()
-        # LangChain handles extraction, chunking, and embeddings
-        self.max_concurrent_files = 5  # Limit concurrent processing
 
     async def queue_text_extraction(self, file_id: str) -> bool:
         """
@@ -35,24 +108,134 @@ class ProcessingService:
         Returns:
             True if successfully queued
         """
+        if file_id in self._inflight_files:
+            logger.info("⏭️ QUEUE: File %s is already in the pipeline", file_id)
+            return True
+        self._inflight_files.add(file_id)
+
         try:
-            logger.info(f"🚀 QUEUE: Starting text extraction for file {file_id}")
+            logger.info("🚀 QUEUE: Starting text extraction for file %s", file_id)
 
-            # Update file status to queued
-            await self._update_file_status(file_id, FileStatus.QUEUED)
-            await self._update_document_processing_status(file_id, "extracting_text")
+            # Update file status to queued and claim the file for this process
+            client = await db.get_supabase_client()
+            claim = client.table("processing_files").update(_claim_fields()).eq("id", file_id)
+            await asyncio.gather(
+                self._update_pipeline_stage(file_id, _QUEUED, "extracting_text"), claim.execute()
+            )
 
-            # Start background processing (fire and forget)
-            logger.info(f"🔄 QUEUE: Creating async task for file {file_id}")
-            asyncio.create_task(self._process_file_pipeline(file_id))
-            logger.info(f"✅ QUEUE: File {file_id} queued successfully")
+            # Hand the file to the background pipeline workers
+            logger.info("🔄 QUEUE: Adding file %s to the extraction queue", file_id)
+            self._ensure_pipeline_workers()
+            self._extraction_queue.put_nowait(file_id)
+            logger.info("✅ QUEUE: File %s queued successfully", file_id)
 
             return True
 
         except Exception as e:
+            self._inflight_files.discard(file_id)
             logger.error(f"❌ QUEUE: Failed to queue file {file_id}: {e}")
             return False
 
+    async def queue_text_extraction_bulk(self, file_ids: List[str]) -> bool:
+        """
+        Queue several files for text extraction with one status update per table.
+
+        Args:
+            file_ids: Processing file IDs
+
+        Returns:
+            True if all files were successfully queued
+        """
+        # Skip files already in the pipeline; claim the rest before the first await
+        file_ids = [file_id for file_id in file_ids if file_id not in self._inflight_files]
+        if not file_ids:
+            return True
+        self._inflight_files.update(file_ids)
+
+        try:
+            logger.info("🚀 QUEUE: Starting text extraction for %s files", len(file_ids))
+            client = await db.get_supabase_client()
+
+            # Queue and claim all files; the returned rows carry the document links
+            file_result = await (
+                client.table("processing_files")
+                .update({"status": _QUEUED, **_claim_fields()})
+                .in_("id", file_ids)
+                .execute()
+            )
+            document_ids = [
+                row["document_id"] for row in file_result.data if row.get("document_id")
+            ]
+            if document_ids:
+                await (
+                    client.table("documents")
+                    .update({"processing_status": "extracting_text"})
+                    .in_("id", document_ids)
+                    .execute()
+                )
+
+            for row in file_result.data:
+                if row.get("batch_id"):
+                    batch_id = row["batch_id"]
+                    self._batch_remaining[batch_id] = self._batch_remaining.get(batch_id, 0) + 1
+
+            # Hand the files to the background pipeline workers
+            self._ensure_pipeline_workers()
+            for file_id in file_ids:
+                self._extraction_queue.put_nowait(file_id)
+            logger.info("✅ QUEUE: %s files queued successfully", len(file_ids))
+
+            return True
+
+        except Exception as e:
+            self._inflight_files.difference_update(file_ids)
+            logger.error(f"❌ QUEUE: Failed to queue {len(file_ids)} files: {e}")
+            return False
+
+    async def resume_queued_files(self) -> int:
+        """
+        Claim and re-queue files left queued or mid-pipeline by a stopped process.
+
+        The pipeline queues live in memory, so files in flight when a process stopped would
+        otherwise never finish. Files are claimed atomically (see claim_in_flight_files): a
+        file is taken only if it is unclaimed or its owner's lease has lapsed, so processes
+        starting together never queue the same file, and this process's own claims are
+        renewed. Files that had already finished extraction resume at the metadata stage (see
+        _run_extraction_stage). Call at startup; the claim renewal task then calls it every
+        third of the lease.
+
+        Returns:
+            Number of files re-queued
+        """
+        try:
+            client = await db.get_supabase_client()
+            result = await client.rpc(
+                "claim_in_flight_files",
+                {
+                    "claimant": _PIPELINE_OWNER,
+                    "statuses": _IN_FLIGHT_STATUSES,
+                    "lease_seconds": settings.pipeline_claim_lease_seconds,
+                },
+            ).execute()
+
+            # Files this process is already running come back too, with their claims renewed
+            file_ids = [
+                row["file_id"] for row in result.data if row["file_id"] not in self._inflight_files
+            ]
+            self._ensure_pipeline_workers()
+            if not file_ids:
+                return 0
+
+            self._inflight_files.update(file_ids)
+            for file_id in file_ids:
+                self._extraction_queue.put_nowait(file_id)
+            logger.info("🔁 QUEUE: Resumed %s files left in flight elsewhere", len(file_ids))
+            return len(file_ids)
+
+        except Exception as e:
+            logger.error(f"❌ QUEUE: Failed to resume queued files: {e}")
+            return 0
+
     async def process_batch(self, batch_id: str) -> Dict[str, Any]:
         """
         Process all files in a batch through the complete pipeline.
@@ -63,26 +246,26 @@ class ProcessingService:
         Returns:
             Dict with processing results
         """
-        logger.info(f"Starting batch processing for batch {batch_id}")
+        logger.info("Starting batch processing for batch %s", batch_id)
+
+        self._bind_pipeline_to_running_loop()
+        self._ensure_claim_renewal()
+        file_ids_by_task: Dict[asyncio.Task, str] = {}
 
         try:
-            # Get all files in the batch
+            # Claim the batch's uploaded files in one UPDATE ... RETURNING. The status filter is
+            # re-checked under the row lock, so a concurrent or retried run can't claim them twice
             client = await db.get_supabase_client()
-            files_result = await (
+            claim_result = await (
                 client.table("processing_files")
-                .select("id, status")
+                .update({"status": _QUEUED, **_claim_fields()})
                 .eq("batch_id", batch_id)
+                .eq("status", _UPLOADED)
                 .execute()
             )
+            file_records = claim_result.data
 
-            if not files_result.data:
-                return {"success": False, "batch_id": batch_id, "error": "No files found in batch"}
-
-            file_ids = [
-                f["id"] for f in files_result.data if f["status"] == FileStatus.UPLOADED.value
-            ]
-
-            if not file_ids:
+            if not file_records:
                 return {
                     "success": False,
                     "batch_id": batch_id,
@@ -90,181 +273,474 @@ class ProcessingService:
                 }
 
             # Update batch status to processing
-            await self._update_batch_status(batch_id, BatchStatus.PROCESSING)
-
-            # Process files with concurrency control
-            semaphore = asyncio.Semaphore(self.max_concurrent_files)
-            tasks = [self._process_file_with_semaphore(semaphore, file_id) for file_id in file_ids]
-
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-
-            # Analyze results
-            successful = sum(1 for r in results if isinstance(r, dict) and r.get("success"))
-            failed = len(results) - successful
+            await self._update_batch_status(batch_id, _BATCH_PROCESSING)
+
+            # The files are in flight in this process, so claim renewal mustn't queue them again
+            self._inflight_files.update(file_record["id"] for file_record in file_records)
+
+            # Process files with concurrency control. Terminal statuses are written as files
+            # finish: everything that completed since the last write goes out in one bulk update,
+            # so finished files reach review without waiting for the batch's stragglers
+            file_ids_by_task = {
+                asyncio.create_task(
+                    self._process_file_pipeline(
+                        file_record["id"], defer_final_status=True, file_record=file_record
+                    )
+                ): file_record["id"]
+                for file_record in file_records
+            }
+            pending = set(file_ids_by_task)
+            successful = failed = 0
+            try:
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    finished = [task.exception() or task.result() for task in done]
+                    results = [r for r in finished if isinstance(r, dict)]
+                    await self._write_final_statuses(
+                        [r for r in results if r.get("final_status_deferred")]
+                    )
+                    self._inflight_files.difference_update(file_ids_by_task[task] for task in done)
+
+                    # Keep running counts rather than every result, and publish them as progress
+                    finished_ok = sum(1 for r in results if r.get("success"))
+                    successful += finished_ok
+                    failed += len(finished) - finished_ok
+                    if pending:
+                        try:
+                            await self._update_batch_status(
+                                batch_id,
+                                _BATCH_PROCESSING,
+                                processed_files=successful,
+                                failed_files=failed,
+                            )
+                        except Exception as e:
+                            # Progress is best-effort; the final status write still happens
+                            logger.warning(
+                                f"⚠️ Failed to update progress for batch {batch_id}: {e}"
+                            )
+            finally:
+                # A cancelled or failed batch stops its in-flight files (and their AI calls) too
+                for task in pending:
+                    task.cancel()
 
             # Update batch with final status
-            final_status = BatchStatus.PROCESSING_COMPLETE if failed == 0 else BatchStatus.FAILED
+            final_status = _BATCH_PROCESSING_COMPLETE if failed == 0 else _BATCH_FAILED
             await self._update_batch_status(
                 batch_id, final_status, processed_files=successful, failed_files=failed
             )
 
             logger.info(
-                f"Batch {batch_id} processing complete: {successful} success, {failed} failed"
+                "Batch %s processing complete: %s success, %s failed", batch_id, successful, failed
             )
 
             return {
                 "success": True,
                 "batch_id": batch_id,
-                "total_files": len(file_ids),
+                "total_files": len(file_records),
                 "successful_files": successful,
                 "failed_files": failed,
-                "status": final_status.value,
+                "status": final_status,
             }
 
         except Exception as e:
             logger.error(f"Batch processing failed for batch {batch_id}: {e}")
-            await self._update_batch_status(batch_id, BatchStatus.FAILED, error_message=str(e))
+            await self._update_batch_status(batch_id, _BATCH_FAILED, error_message=str(e))
             return {"success": False, "batch_id": batch_id, "error": str(e)}
 
-    async def _process_file_with_semaphore(
-        self, semaphore: asyncio.Semaphore, file_id: str
-    ) -> Dict[str, Any]:
-        """Process a single file with concurrency control."""
-        async with semaphore:
-            return await self._process_file_pipeline(file_id)
+        finally:
+            self._inflight_files.difference_update(file_ids_by_task.values())
 
-    async def _process_file_pipeline(self, file_id: str) -> Dict[str, Any]:
+    async def _process_file_pipeline(
+        self,
+        file_id: str,
+        defer_final_status: bool = False,
+        file_record: Optional[Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
         """
         Process a single file through the complete pipeline.
 
         Args:
             file_id: Processing file ID
+            defer_final_status: Leave the terminal status write and batch completion check to
+                the caller (see _write_final_statuses) instead of doing them per file
+            file_record: Processing file record, if the caller already has it
 
         Returns:
             Dict with processing results
         """
         start_time = time.time()
-        processing_logger.log_step("langchain_pipeline_start", file_id=file_id)
 
         try:
-            # Get file path for LangChain processing
+            file_record, langchain_result = await self._run_extraction_stage(file_id, file_record)
+            if not langchain_result["success"]:
+                return langchain_result
+
+            return await self._run_metadata_stage(
+                file_id, file_record, langchain_result, start_time, defer_final_status
+            )
+
+        except Exception as e:
+            return await self._handle_pipeline_failure(
+                file_id, file_record or {}, e, start_time, defer_final_status
+            )
+
+    async def _run_extraction_stage(
+        self, file_id: str, file_record: Optional[Dict[str, Any]] = None
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Pipeline stage 1: extract text, chunk, and embed a file with LangChain.
+
+        Args:
+            file_id: Processing file ID
+            file_record: Processing file record, if already fetched; selected otherwise
+
+        Returns:
+            Tuple of (processing file record, LangChain result)
+        """
+        processing_logger.log_step("langchain_pipeline_start", file_id=file_id)
+
+        # Read the file record once; later stages receive it instead of re-selecting it
+        if file_record is None:
             client = await db.get_supabase_client()
             file_result = (
-                await client.table("processing_files").select("*").eq("id", file_id).execute()
+                await client.table("processing_files")
+                .select(_PIPELINE_FILE_COLUMNS)
+                .eq("id", file_id)
+                .execute()
             )
 
             if not file_result.data:
                 raise ValueError(f"File {file_id} not found")
 
             file_record = file_result.data[0]
-            file_path = file_record.get("stored_path")
 
-            if not file_path:
-                raise ValueError(f"File path not found for file {file_id}")
+        # Resumed after extraction finished: text and chunks are already stored, so reload
+        # them instead of extracting and embedding the file again
+        if file_record.get("status") in _POST_EXTRACTION_STATUSES:
+            return file_record, await self._load_extraction_result(file_id)
 
-            # Use LangChain processor for extraction, chunking, and embeddings
-            # Note: LangChain processor handles status updates internally
-            try:
-                langchain_result = await langchain_processor.process_pdf_file(file_id, file_path)
-            except Exception as e:
-                logger.error(f"LangChain processing failed for file {file_id}: {e}")
-                # Fallback to avoid breaking deployment
-                langchain_result = {"success": False, "error": f"Processing failed: {str(e)}"}
+        file_path = file_record.get("stored_path")
 
-            if not langchain_result["success"]:
-                return langchain_result
+        if not file_path:
+            raise ValueError(f"File path not found for file {file_id}")
 
-            # Step 2: AI Metadata Extraction (still using our custom AI service)
-            step_start = time.time()
-            processing_logger.log_step("ai_metadata_start", file_id=file_id)
-            await self._update_document_processing_status(file_id, "analyzing_metadata")
-            metadata_result = await self.ai_service.extract_metadata(file_id)
-            step_duration = time.time() - step_start
-
-            if not metadata_result["success"]:
-                processing_logger.log_error(
-                    "ai_metadata_failed",
-                    Exception(metadata_result.get("error", "Unknown error")),
-                    file_id=file_id,
-                    duration_seconds=step_duration,
-                )
-                return dict(metadata_result)
-            processing_logger.log_step(
-                "ai_metadata_complete", file_id=file_id, duration_seconds=step_duration
-            )
+        # Use LangChain processor for extraction, chunking, and embeddings
+        # Note: LangChain processor handles status updates internally
+        try:
+            async with self._extraction_semaphore:
+                langchain_result = await langchain_processor.process_pdf_file(file_id, file_path)
+        except Exception as e:
+            logger.error(f"LangChain processing failed for file {file_id}: {e}")
+            # Fallback to avoid breaking deployment
+            langchain_result = {"success": False, "error": f"Processing failed: {str(e)}"}
 
-            # Step 3: Update document record with text metrics
-            # (AI service already saved metadata directly to documents)
-            logger.info(f"📄 STEP 3: Updating document record with text metrics for file {file_id}")
+        return file_record, langchain_result
 
-            # Merge text metrics from langchain with AI metadata
-            combined_metadata = metadata_result.get("metadata", {})
-            combined_metadata.update(
-                {
-                    "preview_text": langchain_result.get("preview_text"),
-                    "page_count": langchain_result.get("page_count"),
-                    "word_count": langchain_result.get("word_count"),
-                    "char_count": langchain_result.get("char_count"),
-                    "chunk_count": langchain_result.get("chunk_count"),
-                }
-            )
+    async def _load_extraction_result(self, file_id: str) -> Dict[str, Any]:
+        """
+        Rebuild the extraction stage result from the text and metrics saved on processing_files.
 
-            document_id = await self._update_document_with_text_metrics(file_id, combined_metadata)
+        Args:
+            file_id: Processing file ID
 
-            # Mark file as ready for review
-            logger.info(f"📋 Marking file {file_id} as ready for review")
-            await self._update_file_status(
-                file_id, FileStatus.REVIEW_PENDING, document_id=document_id
-            )
-            await self._update_document_processing_status(file_id, "ready_for_review")
+        Returns:
+            LangChain-style result for the metadata stage
+        """
+        client = await db.get_supabase_client()
+        file_result = (
+            await client.table("processing_files")
+            .select(", ".join(("extracted_text", *_TEXT_METRIC_FIELDS)))
+            .eq("id", file_id)
+            .execute()
+        )
+        if not file_result.data or file_result.data[0].get("extracted_text") is None:
+            raise ValueError(f"No extracted text saved for file {file_id}")
+
+        saved = file_result.data[0]
+        logger.info("🔁 Resuming file %s at the metadata stage", file_id)
+        return {
+            "success": True,
+            "file_id": file_id,
+            "text_length": len(saved["extracted_text"]),
+            **saved,
+        }
+
+    async def _run_metadata_stage(
+        self,
+        file_id: str,
+        file_record: Dict[str, Any],
+        langchain_result: Dict[str, Any],
+        start_time: float,
+        defer_final_status: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Pipeline stage 2: extract AI metadata and finalize the document for review.
 
-            # Clean up processing_files to save storage
-            # Remove large fields that are no longer needed
-            logger.info(f"🧹 Cleaning up processing_files record {file_id}")
-            await self._cleanup_processing_file(file_id)
+        Args:
+            file_id: Processing file ID
+            file_record: Processing file record from the extraction stage
+            langchain_result: Successful result of the extraction stage
+            start_time: Pipeline start time, for the duration log
+            defer_final_status: See _process_file_pipeline
 
-            # Check if batch is complete after this file finishes
-            client = await db.get_supabase_client()
-            file_result = (
-                await client.table("processing_files")
-                .select("batch_id")
-                .eq("id", file_id)
-                .execute()
+        Returns:
+            Dict with processing results
+        """
+        # Step 2: AI Metadata Extraction (still using our custom AI service)
+        step_start = time.time()
+        processing_logger.log_step("ai_metadata_start", file_id=file_id)
+        # Carry the text and metrics LangChain just saved so the AI service needn't re-read them
+        text_metrics = {field: langchain_result.get(field) for field in _TEXT_METRIC_FIELDS}
+        file_record.update(text_metrics, extracted_text=langchain_result.get("extracted_text"))
+
+        # Step 3 (text metrics on the document) doesn't depend on the AI metadata, so its
+        # write runs while the AI call is in flight
+        logger.info("📄 STEP 3: Updating document record with text metrics for file %s", file_id)
+        metadata_task = asyncio.create_task(self._extract_ai_metadata(file_id, file_record))
+        try:
+            document_id = await self._update_document_with_text_metrics(
+                file_id, text_metrics, file_record.get("document_id")
             )
-            if file_result.data:
-                await self._check_batch_completion(file_result.data[0]["batch_id"])
-
-            total_duration = time.time() - start_time
-            logger.info(
-                f"🎯 PIPELINE COMPLETE: File {file_id} processed successfully in {total_duration:.2f}s"
+            metadata_result = await metadata_task
+        finally:
+            # If the metrics write failed, stop the AI call before failure cleanup deletes the
+            # document, so it can't write metadata for a deleted document or spend more tokens
+            if not metadata_task.done():
+                metadata_task.cancel()
+                await asyncio.wait([metadata_task])
+        step_duration = time.time() - step_start
+
+        if not metadata_result["success"]:
+            processing_logger.log_error(
+                "ai_metadata_failed",
+                Exception(metadata_result.get("error", "Unknown error")),
+                file_id=file_id,
+                duration_seconds=step_duration,
+            )
+            return metadata_result
+        processing_logger.log_step(
+            "ai_metadata_complete", file_id=file_id, duration_seconds=step_duration
+        )
+
+        # Merge text metrics from langchain with AI metadata
+        # (AI service already saved metadata directly to documents)
+        combined_metadata = {**metadata_result.get("metadata", {}), **text_metrics}
+
+        # Mark file as ready for review (deferred: the batch writes all statuses at once)
+        if not defer_final_status:
+            logger.info("📋 Marking file %s as ready for review", file_id)
+            # Also clears the large processing_files fields that now live in documents
+            await self._update_pipeline_stage(
+                file_id, _REVIEW_PENDING, "ready_for_review", clear_extracted=True
             )
 
+        total_duration = time.time() - start_time
+        logger.info(
+            "🎯 PIPELINE COMPLETE: File %s processed successfully in %.2fs",
+            file_id,
+            total_duration,
+        )
+
+        return {
+            "success": True,
+            "file_id": file_id,
+            "document_id": document_id,
+            "text_length": langchain_result.get("text_length", 0),
+            "page_count": text_metrics["page_count"] or 0,
+            "chunk_count": text_metrics["chunk_count"] or 0,
+            "metadata": combined_metadata,
+            "status": _REVIEW_PENDING,
+            "final_status_deferred": defer_final_status,
+        }
+
+    async def _extract_ai_metadata(
+        self, file_id: str, file_record: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Run AI metadata extraction within the AI stage's concurrency limit."""
+        async with self._ai_semaphore:
+            return await self.ai_service.extract_metadata(file_id, file_record)
+
+    async def _handle_pipeline_failure(
+        self,
+        file_id: str,
+        file_record: Dict[str, Any],
+        error: Exception,
+        start_time: float,
+        defer_final_status: bool = False,
+    ) -> Dict[str, Any]:
+        """Clean up after a pipeline stage raised and record the failure."""
+        total_duration = time.time() - start_time
+        logger.error(
+            f"💥 PIPELINE FAILED: File {file_id} failed after {total_duration:.2f}s: {error}"
+        )
+
+        # Instead of marking as failed, delete the document (cascades to chunks, etc.)
+        await self._delete_failed_document(file_id, error_message=str(error))
+
+        if defer_final_status:
             return {
-                "success": True,
+                "success": False,
                 "file_id": file_id,
-                "text_length": langchain_result.get("text_length", 0),
-                "page_count": 0,  # LangChain doesn't track page count in this simple version
-                "chunk_count": langchain_result.get("chunk_count", 0),
-                "metadata": metadata_result.get("metadata", {}),
-                "status": FileStatus.REVIEW_PENDING.value,
+                "error": str(error),
+                "status": _EXTRACTION_FAILED,
+                "final_status_deferred": True,
             }
 
-        except Exception as e:
-            total_duration = time.time() - start_time
-            logger.error(
-                f"💥 PIPELINE FAILED: File {file_id} failed after {total_duration:.2f}s: {e}"
+        # Still update processing file status for tracking
+        await self._update_file_status(file_id, _EXTRACTION_FAILED, error_message=str(error))
+
+        return {"success": False, "file_id": file_id, "error": str(error)}
+
+    @classmethod
+    def _bind_pipeline_to_running_loop(cls):
+        """Recreate the shared queues and limits if the event loop changed since they were made."""
+        loop = asyncio.get_running_loop()
+        if cls._pipeline_loop is loop:
+            return
+        if cls._pipeline_loop is not None:
+            logger.info("🔄 QUEUE: Event loop changed; resetting the processing pipeline")
+        cls._pipeline_loop = loop
+        cls._extraction_semaphore = asyncio.Semaphore(settings.max_concurrent_extractions)
+        cls._ai_semaphore = asyncio.Semaphore(settings.max_concurrent_ai_requests)
+        cls._extraction_queue = asyncio.Queue()
+        cls._metadata_queue = asyncio.Queue(maxsize=settings.max_concurrent_ai_requests * 2)
+        # Workers and queued files of the old loop are gone; resume_queued_files picks them up
+        cls._extraction_workers.clear()
+        cls._metadata_workers.clear()
+        cls._batch_remaining.clear()
+        cls._inflight_files.clear()
+        cls._claim_renewal_task = None
+
+    def _ensure_pipeline_workers(self):
+        """Start the extraction and metadata stage workers, replacing any that have stopped."""
+        self._bind_pipeline_to_running_loop()
+        self._ensure_claim_renewal()
+        stages = (
+            (
+                self._extraction_workers,
+                self._extraction_worker,
+                settings.max_concurrent_extractions,
+            ),
+            (self._metadata_workers, self._metadata_worker, settings.max_concurrent_ai_requests),
+        )
+        for workers, worker, count in stages:
+            # Update in place: the lists are shared by all instances
+            workers[:] = [task for task in workers if not task.done()]
+            workers.extend(asyncio.create_task(worker()) for _ in range(count - len(workers)))
+
+    def _ensure_claim_renewal(self):
+        """Start the claim renewal task if it isn't running."""
+        task = ProcessingService._claim_renewal_task
+        if task is None or task.done():
+            ProcessingService._claim_renewal_task = asyncio.create_task(self._renew_claims())
+
+    async def _renew_claims(self):
+        """Keep this process's file claims from lapsing and pick up files whose owner stopped."""
+        while True:
+            await asyncio.sleep(settings.pipeline_claim_lease_seconds / 3)
+            await self.resume_queued_files()
+
+    async def stop_pipeline_workers(self):
+        """
+        Cancel the pipeline workers and wait for them to stop.
+
+        Call on shutdown, before the database and HTTP clients are closed. Cancelled files
+        keep their in-flight status and documents and have their claims released, so
+        resume_queued_files picks them up on the next start instead of failing them on
+        closed clients.
+        """
+        workers = [*self._extraction_workers, *self._metadata_workers]
+        self._extraction_workers.clear()
+        self._metadata_workers.clear()
+        if ProcessingService._claim_renewal_task is not None:
+            workers.append(ProcessingService._claim_renewal_task)
+            ProcessingService._claim_renewal_task = None
+        for task in workers:
+            task.cancel()
+        if workers:
+            await asyncio.gather(*workers, return_exceptions=True)
+            logger.info("🛑 QUEUE: Stopped %s pipeline tasks", len(workers))
+
+        # Without this the next process would wait out the lease before resuming the files
+        try:
+            client = await db.get_supabase_client()
+            await (
+                client.table("processing_files")
+                .update({"claimed_by": None, "claimed_at": None})
+                .eq("claimed_by", _PIPELINE_OWNER)
+                .execute()
             )
+        except Exception as e:
+            logger.warning(f"⚠️ QUEUE: Failed to release in-flight file claims: {e}")
+
+    async def _extraction_worker(self):
+        """Run queued files through the extraction stage and hand them to the metadata stage."""
+        while True:
+            file_id = await self._extraction_queue.get()
+            start_time = time.time()
+            file_record: Dict[str, Any] = {}
+            handed_off = False
+            try:
+                file_record, langchain_result = await self._run_extraction_stage(file_id)
+                if langchain_result["success"]:
+                    # Blocks while the metadata stage is saturated, holding back extraction
+                    await self._metadata_queue.put(
+                        (file_id, file_record, langchain_result, start_time)
+                    )
+                    handed_off = True
+            except asyncio.CancelledError:
+                # Shutdown, not a pipeline failure: the file stays in flight for resume
+                raise
+            except Exception as e:
+                try:
+                    await self._handle_pipeline_failure(file_id, file_record, e, start_time)
+                except Exception as failure_error:
+                    logger.error(
+                        f"Failed to record pipeline failure for {file_id}: {failure_error}"
+                    )
+            finally:
+                self._extraction_queue.task_done()
+
+            if not handed_off:
+                await self._file_finished(file_id, file_record.get("batch_id"))
+
+    async def _metadata_worker(self):
+        """Run extracted files through the metadata stage."""
+        while True:
+            file_id, file_record, langchain_result, start_time = await self._metadata_queue.get()
+            try:
+                await self._run_metadata_stage(file_id, file_record, langchain_result, start_time)
+            except asyncio.CancelledError:
+                # Shutdown, not a pipeline failure: the file stays in flight for resume
+                raise
+            except Exception as e:
+                try:
+                    await self._handle_pipeline_failure(file_id, file_record, e, start_time)
+                except Exception as failure_error:
+                    logger.error(
+                        f"Failed to record pipeline failure for {file_id}: {failure_error}"
+                    )
+            finally:
+                self._metadata_queue.task_done()
+
+            await self._file_finished(file_id, file_record.get("batch_id"))
+
+    async def _file_finished(self, file_id: str, batch_id: Optional[str]):
+        """
+        Release a worker-pipeline file that reached a terminal status and check its batch.
 
-            # Instead of marking as failed, delete the document (cascades to chunks, etc.)
-            await self._delete_failed_document(file_id, error_message=str(e))
+        Files queued through queue_text_extraction_bulk are counted per batch, and only the
+        last one to finish runs the check. Untracked files (single queues, resumed files)
+        check every time.
 
-            # Still update processing file status for tracking
-            await self._update_file_status(
-                file_id, FileStatus.EXTRACTION_FAILED, error_message=str(e)
-            )
+        Args:
+            file_id: Processing file ID
+            batch_id: The file's batch ID, if known
+        """
+        self._inflight_files.discard(file_id)
 
-            # Check if batch is complete after this file fails
-            try:
+        try:
+            if batch_id is None:
                 client = await db.get_supabase_client()
                 file_result = (
                     await client.table("processing_files")
@@ -272,15 +748,75 @@ class ProcessingService:
                     .eq("id", file_id)
                     .execute()
                 )
-                if file_result.data:
-                    await self._check_batch_completion(file_result.data[0]["batch_id"])
-            except Exception as batch_check_error:
-                logger.error(f"Failed to check batch completion: {batch_check_error}")
+                batch_id = file_result.data[0]["batch_id"] if file_result.data else None
+            if not batch_id:
+                return
 
-            return {"success": False, "file_id": file_id, "error": str(e)}
+            remaining = self._batch_remaining.get(batch_id)
+            if remaining is not None:
+                if remaining > 1:
+                    self._batch_remaining[batch_id] = remaining - 1
+                    return
+                del self._batch_remaining[batch_id]
+
+            await self._check_batch_completion(batch_id)
+        except Exception as batch_check_error:
+            logger.error(f"Failed to check batch completion: {batch_check_error}")
+
+    async def _write_final_statuses(self, results: List[Dict[str, Any]]):
+        """
+        Write the terminal statuses of deferred pipeline results with bulk updates.
+
+        Successful files share one processing_files update (status plus cleanup) and one
+        documents update; failures are grouped by error message.
+
+        Args:
+            results: Pipeline results returned with final_status_deferred set
+        """
+        client = await db.get_supabase_client()
+
+        succeeded = [r for r in results if r["success"]]
+        if succeeded:
+            logger.info("📋 Marking %s files as ready for review", len(succeeded))
+            await (
+                client.table("processing_files")
+                .update(
+                    {
+                        "status": _REVIEW_PENDING,
+                        **_PROCESSING_FILE_CLEANUP_FIELDS,
+                    }
+                )
+                .in_("id", [r["file_id"] for r in succeeded])
+                .execute()
+            )
+            document_ids = [r["document_id"] for r in succeeded if r.get("document_id")]
+            if document_ids:
+                await (
+                    client.table("documents")
+                    .update({"processing_status": "ready_for_review"})
+                    .in_("id", document_ids)
+                    .execute()
+                )
+
+        failed_by_error: Dict[str, List[str]] = {}
+        for r in results:
+            if not r["success"]:
+                failed_by_error.setdefault(r["error"], []).append(r["file_id"])
+        for error_message, file_ids in failed_by_error.items():
+            await (
+                client.table("processing_files")
+                .update(
+                    {
+                        "status": _EXTRACTION_FAILED,
+                        "error_message": error_message,
+                    }
+                )
+                .in_("id", file_ids)
+                .execute()
+            )
 
     async def _update_document_with_text_metrics(
-        self, file_id: str, ai_metadata: Dict[str, Any]
+        self, file_id: str, text_metrics: Dict[str, Any], document_id: Optional[str] = None
     ) -> str:
         """
         Update document with text metrics from langchain processing.
@@ -288,62 +824,57 @@ class ProcessingService:
 
         Args:
             file_id: Processing file ID
-            ai_metadata: Extracted AI metadata
+            text_metrics: Text metrics from langchain processing
+            document_id: Linked document ID, if the caller already has it
 
         Returns:
             Document ID
         """
         try:
-            # Get processing file record and its document
             client = await db.get_supabase_client()
-            file_result = (
-                await client.table("processing_files")
-                .select("document_id")
-                .eq("id", file_id)
-                .execute()
-            )
 
-            if not file_result.data:
-                raise ValueError(f"Processing file {file_id} not found")
+            # Get processing file record and its document unless the caller passed it
+            if document_id is None:
+                file_result = (
+                    await client.table("processing_files")
+                    .select("document_id")
+                    .eq("id", file_id)
+                    .execute()
+                )
 
-            document_id = file_result.data[0].get("document_id")
+                if not file_result.data:
+                    raise ValueError(f"Processing file {file_id} not found")
+
+                document_id = file_result.data[0].get("document_id")
 
             if not document_id:
                 raise ValueError(f"No document linked to processing file {file_id}")
 
             # Only update text metrics from langchain processor
             # AI metadata is saved directly by AI service now
+            # None values are skipped to avoid overwriting existing data
             document_update_data = {
-                # Text metadata from extraction
-                "preview_text": ai_metadata.get("preview_text"),
-                "page_count": ai_metadata.get("page_count"),
-                "word_count": ai_metadata.get("word_count"),
-                "char_count": ai_metadata.get("char_count"),
-                "chunk_count": ai_metadata.get("chunk_count"),
-                "updated_at": datetime.utcnow().isoformat(),
+                field: text_metrics[field]
+                for field in _TEXT_METRIC_FIELDS
+                if text_metrics.get(field) is not None
             }
 
-            # Remove None values to avoid overwriting existing data
-            document_update_data = {k: v for k, v in document_update_data.items() if v is not None}
-
-            # Update the existing document record
-            document_result = (
-                await client.table("documents")
-                .update(document_update_data)
-                .eq("id", document_id)
-                .execute()
-            )
-
-            if not document_result.data:
-                raise ValueError(f"Failed to update document {document_id}")
+            # Update the existing document record (nothing to write if no metrics came back)
+            if document_update_data:
+                document_result = (
+                    await client.table("documents")
+                    .update(document_update_data)
+                    .eq("id", document_id)
+                    .execute()
+                )
 
-            # Update document chunks to reference the document (in case they weren't linked before)
-            await client.table("document_chunks").update({"document_id": document_id}).eq(
-                "processing_file_id", file_id
-            ).execute()
+                if not document_result.data:
+                    raise ValueError(f"Failed to update document {document_id}")
 
             logger.info(
-                f"✅ Document {document_id} updated with AI metadata for file {file_id} and ready for review"
+                "✅ Document %s updated with AI metadata for file %s and ready for review",
+                document_id,
+                file_id,
             )
             return str(document_id)
 
@@ -365,65 +896,24 @@ class ProcessingService:
         Returns:
             Dict with approval results
         """
-        logger.info(f"Approving file {file_id} for library by reviewer {reviewer_id}")
+        logger.info("Approving file %s for library by reviewer %s", file_id, reviewer_id)
 
         try:
-            # Get processing file record
+            # Status check, document update and file update run in one transaction server-side
             client = await db.get_supabase_client()
-            file_result = await (
-                client.table("processing_files").select("*").eq("id", file_id).execute()
-            )
-            if not file_result.data:
-                raise ValueError(f"File {file_id} not found")
-
-            file_record = file_result.data[0]
-            document_id = file_record.get("document_id")
-
-            if not document_id:
-                raise ValueError(f"No document linked to processing file {file_id}")
-
-            if file_record["status"] != FileStatus.REVIEW_PENDING.value:
-                raise ValueError(
-                    f"File {file_id} is not ready for review (status: {file_record['status']})"
-                )
-
-            # Update existing document to mark as approved and active
-            document_update_data = {
-                # Document approved - mark as reviewed and active in library
-                "is_reviewed": True,
-                "reviewed_by": reviewer_id,
-                "reviewed_at": datetime.utcnow().isoformat(),
-                "review_notes": review_notes,
-                "updated_at": datetime.utcnow().isoformat(),
-            }
-
-            # Update the document record
-            document_result = (
-                await client.table("documents")
-                .update(document_update_data)
-                .eq("id", document_id)
-                .execute()
-            )
-
-            if not document_result.data:
-                raise ValueError(f"Failed to update document {document_id}")
-
-            # Update processing file status
-            await self._update_file_status(
-                file_id,
-                FileStatus.APPROVED,
-                reviewed_by=reviewer_id,
-                reviewed_at=datetime.utcnow().isoformat(),
-                review_notes=review_notes,
-            )
+            result = await client.rpc(
+                "approve_processing_file",
+                {"fid": file_id, "reviewer": reviewer_id, "notes": review_notes},
+            ).execute()
+            document_id = result.data
 
-            logger.info(f"File {file_id} approved and document {document_id} moved to library")
+            logger.info("File %s approved and document %s moved to library", file_id, document_id)
 
             return {
                 "success": True,
                 "file_id": file_id,
                 "document_id": document_id,
-                "status": FileStatus.APPROVED.value,
+                "status": _APPROVED,
             }
 
         except Exception as e:
@@ -444,24 +934,24 @@ class ProcessingService:
         Returns:
             Dict with rejection results
         """
-        logger.info(f"Rejecting file {file_id} by reviewer {reviewer_id}")
+        logger.info("Rejecting file %s by reviewer %s", file_id, reviewer_id)
 
         try:
             # Update processing file status
             await self._update_file_status(
                 file_id,
-                FileStatus.REJECTED,
+                _REJECTED,
                 reviewed_by=reviewer_id,
-                reviewed_at=datetime.utcnow().isoformat(),
+                reviewed_at=datetime.now(timezone.utc).isoformat(),
                 review_notes=rejection_reason,
             )
 
-            logger.info(f"File {file_id} rejected: {rejection_reason}")
+            logger.info("File %s rejected: %s", file_id, rejection_reason)
 
             return {
                 "success": True,
                 "file_id": file_id,
-                "status": FileStatus.REJECTED.value,
+                "status": _REJECTED,
                 "reason": rejection_reason,
             }
 
@@ -469,15 +959,22 @@ class ProcessingService:
             logger.error(f"Failed to reject file {file_id}: {e}")
             return {"success": False, "file_id": file_id, "error": str(e)}
 
-    async def get_processing_status(self, batch_id: str) -> Dict[str, Any]:
+    async def get_processing_status(
+        self, batch_id: str, statuses: Optional[List[str]] = None, limit: int = 500
+    ) -> Dict[str, Any]:
         """
         Get detailed processing status for a batch.
 
+        Per-status counts are aggregated in the database; file rows are only fetched
+        when the caller asks for specific statuses.
+
         Args:
             batch_id: Processing job/batch ID
+            statuses: File statuses whose rows should be returned in files_by_status
+            limit: Maximum number of file rows to return
 
         Returns:
-            Dict with batch and file statuses
+            Dict with batch info, per-status counts and (optionally) file rows
         """
         try:
             # Get batch info
@@ -490,39 +987,43 @@ class ProcessingService:
 
             batch_info = batch_result.data[0]
 
-            # Get file statuses
-            files_result = await (
-                client.table("processing_files")
-                .select("id, original_filename, status, error_message, created_at, updated_at")
-                .eq("batch_id", batch_id)
-                .execute()
-            )
-
-            files_by_status: Dict[str, List[Dict[str, Any]]] = {}
-            for file_record in files_result.data:
-                status = file_record["status"]
-                if status not in files_by_status:
-                    files_by_status[status] = []
-                files_by_status[status].append(file_record)
+            # Get per-status file counts (one row per distinct status)
+            counts_result = await client.rpc(
+                "get_batch_file_status_counts", {"bid": batch_id}
+            ).execute()
+            status_counts = {row["status"]: row["file_count"] for row in counts_result.data or []}
+
+            files_by_status: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+            if statuses:
+                files_result = await (
+                    client.table("processing_files")
+                    .select("id, original_filename, status, error_message, created_at, updated_at")
+                    .eq("batch_id", batch_id)
+                    .in_("status", statuses)
+                    .limit(limit)
+                    .execute()
+                )
+                for file_record in files_result.data:
+                    files_by_status[file_record["status"]].append(file_record)
 
             return {
                 "success": True,
                 "batch_id": batch_id,
                 "batch_info": batch_info,
-                "files_by_status": files_by_status,
-                "total_files": len(files_result.data),
+                "status_counts": status_counts,
+                "files_by_status": dict(files_by_status),
+                "total_files": sum(status_counts.values()),
             }
 
         except Exception as e:
             logger.error(f"Failed to get processing status for batch {batch_id}: {e}")
             return {"success": False, "batch_id": batch_id, "error": str(e)}
 
-    async def _update_file_status(self, file_id: str, status: FileStatus, **kwargs):
+    async def _update_file_status(self, file_id: str, status: str, **kwargs):
         """Update file processing status."""
         try:
             update_data = {
-                "status": status.value,
-                "updated_at": datetime.utcnow().isoformat(),
+                "status": status,
                 **kwargs,
             }
 
@@ -533,39 +1034,45 @@ class ProcessingService:
             logger.error(f"Failed to update file {file_id} status: {e}")
             raise
 
-    async def _update_document_processing_status(
-        self, file_id: str, processing_status: str, **kwargs
+    async def _update_pipeline_stage(
+        self, file_id: str, file_status: str, doc_status: str, clear_extracted: bool = False
     ):
-        """Update document processing status based on processing file ID."""
+        """
+        Set a file's status and its document's processing_status in one round-trip.
+
+        Args:
+            file_id: Processing file ID
+            file_status: New processing_files status
+            doc_status: New documents processing_status
+            clear_extracted: Also clear the extracted text and metrics on processing_files
+        """
         try:
             client = await db.get_supabase_client()
 
-            # Get document_id from processing file
-            file_result = (
-                await client.table("processing_files")
-                .select("document_id")
-                .eq("id", file_id)
-                .limit(1)
-                .execute()
-            )
-            if not file_result.data:
-                raise ValueError(f"Processing file {file_id} not found")
-
-            document_id = file_result.data[0]["document_id"]
+            # The function updates both rows in one transaction and returns the document ID
+            result = await client.rpc(
+                "update_pipeline_stage",
+                {
+                    "fid": file_id,
+                    "file_status": file_status,
+                    "doc_status": doc_status,
+                    "clear_extracted": clear_extracted,
+                },
+            ).execute()
+            document_id = result.data
             if not document_id:
                 raise ValueError(f"No document linked to processing file {file_id}")
 
-            # Update document with processing status
-            update_data = {
-                "processing_status": processing_status,
-                "updated_at": datetime.utcnow().isoformat(),
-                **kwargs,
-            }
-            await client.table("documents").update(update_data).eq("id", document_id).execute()
-            logger.info(f"Updated document {document_id} processing_status to {processing_status}")
+            logger.info(
+                "Updated file %s to %s, document %s to %s",
+                file_id,
+                file_status,
+                document_id,
+                doc_status,
+            )
 
         except Exception as e:
-            logger.error(f"Failed to update document processing status for file {file_id}: {e}")
+            logger.error(f"Failed to update pipeline stage for file {file_id}: {e}")
             raise
 
     async def _delete_failed_document(self, file_id: str, error_message: str = None):
@@ -594,42 +1101,17 @@ class ProcessingService:
 
             # Delete document - this will cascade to document_chunks, document_access, etc.
             await client.table("documents").delete().eq("id", document_id).execute()
-            logger.info(f"Deleted failed document {document_id} and cascaded cleanup")
+            logger.info("Deleted failed document %s and cascaded cleanup", document_id)
 
         except Exception as e:
             logger.error(f"Failed to delete document for failed file {file_id}: {e}")
             # Don't re-raise - processing failure cleanup shouldn't fail the batch
 
-    async def _cleanup_processing_file(self, file_id: str):
-        """Clean up processing_files record after successful processing to save storage."""
-        try:
-            client = await db.get_supabase_client()
-
-            # Clear large fields that are no longer needed
-            # Keep audit fields like batch_id, status, timestamps
-            cleanup_data = {
-                "extracted_text": None,  # This is the largest field
-                "preview_text": None,  # Now stored in documents
-                "page_count": None,  # Now stored in documents
-                "word_count": None,  # Now stored in documents
-                "char_count": None,  # Now stored in documents
-                "chunk_count": None,  # Now stored in documents
-                "updated_at": datetime.utcnow().isoformat(),
-            }
-
-            await client.table("processing_files").update(cleanup_data).eq("id", file_id).execute()
-            logger.info(f"Cleaned up processing_files record {file_id} to save storage")
-
-        except Exception as e:
-            logger.warning(f"Failed to cleanup processing_files {file_id}: {e}")
-            # Don't fail the processing if cleanup fails
-
-    async def _update_batch_status(self, batch_id: str, status: BatchStatus, **kwargs):
+    async def _update_batch_status(self, batch_id: str, status: str, **kwargs):
         """Update batch processing status."""
         try:
             update_data = {
-                "status": status.value,
-                "updated_at": datetime.utcnow().isoformat(),
+                "status": status,
                 **kwargs,
             }
 
@@ -645,63 +1127,56 @@ class ProcessingService:
         try:
             client = await db.get_supabase_client()
 
-            # Get all files for this batch
-            files_result = (
-                await client.table("processing_files")
-                .select("status")
-                .eq("batch_id", batch_id)
-                .execute()
-            )
+            # Count files by status in the database (one row per distinct status)
+            counts_result = await client.rpc(
+                "get_batch_file_status_counts", {"bid": batch_id}
+            ).execute()
 
-            if not files_result.data:
+            if not counts_result.data:
                 logger.warning(f"No files found for batch {batch_id}")
                 return
 
-            # Count files by status
-            status_counts: Dict[str, int] = {}
-            for file_data in files_result.data:
-                status = file_data["status"]
-                status_counts[status] = status_counts.get(status, 0) + 1
+            status_counts = {row["status"]: row["file_count"] for row in counts_result.data}
 
-            total_files = len(files_result.data)
-            completed_files = status_counts.get("review_pending", 0) + status_counts.get(
-                "approved", 0
-            )
-            failed_files = (
-                status_counts.get("extraction_failed", 0)
-                + status_counts.get("analysis_failed", 0)
-                + status_counts.get("embedding_failed", 0)
-            )
+            total_files = sum(status_counts.values())
+            completed_files = failed_files = 0
+            for status, count in status_counts.items():
+                if status in _TERMINAL_OK:
+                    completed_files += count
+                elif status in _TERMINAL_FAIL:
+                    failed_files += count
 
             # Check if all files are in final states
             processing_files = total_files - completed_files - failed_files
 
             logger.info(
-                f"Batch {batch_id}: {total_files} total, {completed_files} completed, {failed_files} failed, {processing_files} still processing"
+                "Batch %s: %s total, %s completed, %s failed, %s still processing",
+                batch_id,
+                total_files,
+                completed_files,
+                failed_files,
+                processing_files,
             )
 
             if processing_files == 0:  # All files are in final states
-                from app.models.enums import BatchStatus
-
                 if failed_files == 0:
-                    final_status = BatchStatus.PROCESSING_COMPLETE
+                    final_status = _BATCH_PROCESSING_COMPLETE
                 elif completed_files > 0:
-                    final_status = BatchStatus.PARTIALLY_COMPLETED
+                    final_status = _BATCH_PARTIALLY_COMPLETED
                 else:
-                    final_status = BatchStatus.FAILED
+                    final_status = _BATCH_FAILED
 
                 # Update batch status
                 await client.table("processing_jobs").update(
                     {
-                        "status": final_status.value,
+                        "status": final_status,
                         "completed_files": completed_files,
                         "failed_files": failed_files,
-                        "updated_at": datetime.utcnow().isoformat(),
                     }
                 ).eq("id", batch_id).execute()
 
                 logger.info(
-                    f"✅ BATCH COMPLETE: Updated batch {batch_id} status to {final_status.value}"
+                    "✅ BATCH COMPLETE: Updated batch %s status to %s", batch_id, final_status
                 )
 
         except Exception as e:
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Re-hash content_hash values written before the switch from SHA-256 to BLAKE3.
+
+Downloads each stored file, and where the row still holds the file's SHA-256 digest,
+replaces it with the BLAKE3 digest that uploads are now matched against. Rows that
+already hold BLAKE3 digests are left alone, so the script can be re-run safely.
+Once it reports no remaining legacy rows, set LEGACY_SHA256_DEDUP=false.
+
+Usage:
+    python scripts/backfill_content_hash.py
+"""
+
+import asyncio
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.core.database import db  # noqa: E402
+from app.utils.file_utils import (  # noqa: E402
+    calculate_content_hash,
+    content_hash_to_bytea,
+    new_legacy_content_hasher,
+)
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 500
+
+# Table -> column holding the storage path of the row's file
+TABLES = {"documents": "storage_path", "processing_files": "stored_path"}
+
+
+async def backfill_table(table: str, path_column: str) -> int:
+    """
+    Re-hash the legacy SHA-256 content hashes of one table.
+
+    Args:
+        table: Table name
+        path_column: Column with the storage path of each row's file
+
+    Returns:
+        Number of rows updated
+    """
+    client = await db.get_supabase_client()
+    updated = 0
+    start = 0
+    while True:
+        result = await (
+            client.table(table)
+            .select(f"id, content_hash, {path_column}")
+            .not_.is_("content_hash", "null")
+            .order("id")
+            .range(start, start + PAGE_SIZE - 1)
+            .execute()
+        )
+        for row in result.data:
+            try:
+                content = await client.storage.from_("documents").download(row[path_column])
+            except Exception as e:
+                logger.warning(f"⚠️ Skipping {table} {row['id']}: download failed: {e}")
+                continue
+
+            legacy_hasher = new_legacy_content_hasher()
+            legacy_hasher.update(content)
+            if row["content_hash"] != content_hash_to_bytea(legacy_hasher.hexdigest()):
+                continue  # Already BLAKE3 (or not this file's content); leave it alone
+
+            await (
+                client.table(table)
+                .update({"content_hash": content_hash_to_bytea(calculate_content_hash(content))})
+                .eq("id", row["id"])
+                .execute()
+            )
+            updated += 1
+
+        if len(result.data) < PAGE_SIZE:
+            return updated
+        start += PAGE_SIZE
+
+
+async def main():
+    """Backfill every table with content hashes."""
+    try:
+        for table, path_column in TABLES.items():
+            updated = await backfill_table(table, path_column)
+            logger.warning(f"✅ {table}: re-hashed {updated} legacy SHA-256 content hashes")
+    finally:
+        await db.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+    asyncio.run(main())
@@ -0,0 +1,40 @@
+-- Add search_chunks function for parameterized vector similarity search
+-- Replaces the SQL string built in EmbeddingService.search_similar_chunks, which
+-- interpolated the query vector and category filter into a raw query
+
+CREATE OR REPLACE FUNCTION search_chunks(
+    q vector(1536),
+    cats text[] DEFAULT NULL,
+    k integer DEFAULT 10
+)
+RETURNS TABLE (
+    content text,
+    chunk_index integer,
+    original_filename text,
+    title text,
+    doc_type text,
+    doc_category text,
+    similarity_score double precision
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        dc.content,
+        dc.chunk_index,
+        d.original_filename,
+        d.title,
+        d.doc_type::text,
+        d.doc_category::text,
+        1 - (dc.embedding <=> q) AS similarity_score
+    FROM document_chunks dc
+    JOIN documents d ON dc.document_id = d.id
+    WHERE d.is_reviewed = true
+      AND d.is_deleted = false
+      AND (cats IS NULL OR d.doc_category::text = ANY(cats))
+    ORDER BY dc.embedding <=> q
+    LIMIT k;
+$$;
+
+-- Comments for documentation
+COMMENT ON FUNCTION search_chunks(vector, text[], integer) IS 'Cosine similarity search over approved document chunks, optionally filtered by doc_category';
@@ -0,0 +1,48 @@
+-- Push the similarity threshold into search_chunks and index chunk embeddings
+-- Filtering in SQL means rows below the threshold no longer consume LIMIT slots
+
+-- Replace search_chunks with a version that takes the similarity threshold
+DROP FUNCTION IF EXISTS search_chunks(vector, text[], integer);
+
+CREATE OR REPLACE FUNCTION search_chunks(
+    q vector(1536),
+    cats text[] DEFAULT NULL,
+    k integer DEFAULT 10,
+    thr double precision DEFAULT 0.0
+)
+RETURNS TABLE (
+    content text,
+    chunk_index integer,
+    original_filename text,
+    title text,
+    doc_type text,
+    doc_category text,
+    similarity_score double precision
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        dc.content,
+        dc.chunk_index,
+        d.original_filename,
+        d.title,
+        d.doc_type::text,
+        d.doc_category::text,
+        1 - (dc.embedding <=> q) AS similarity_score
+    FROM document_chunks dc
+    JOIN documents d ON dc.document_id = d.id
+    WHERE d.is_reviewed = true
+      AND d.is_deleted = false
+      AND (cats IS NULL OR d.doc_category::text = ANY(cats))
+      AND 1 - (dc.embedding <=> q) >= thr
+    ORDER BY dc.embedding <=> q
+    LIMIT k;
+$$;
+
+-- HNSW index so top-k cosine search uses graph traversal instead of a sequential scan
+CREATE INDEX IF NOT EXISTS idx_document_chunks_embedding_hnsw
+ON document_chunks USING hnsw (embedding vector_cosine_ops);
+
+-- Comments for documentation
+COMMENT ON FUNCTION search_chunks(vector, text[], integer, double precision) IS 'Cosine similarity search over approved document chunks, filtered by doc_category and minimum similarity';
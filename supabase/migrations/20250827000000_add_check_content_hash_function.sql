@@ -0,0 +1,49 @@
+-- Add check_content_hash function for single round-trip upload deduplication
+-- Replaces the two separate documents / processing_files lookups in
+-- FileService._process_single_file
+
+CREATE OR REPLACE FUNCTION check_content_hash(h text)
+RETURNS TABLE (
+    source text,
+    id uuid,
+    title text,
+    status text
+)
+LANGUAGE sql
+STABLE
+AS $$
+    -- Library documents take precedence over files still in the pipeline
+    (
+        SELECT 'document'::text, d.id, d.title, NULL::text
+        FROM documents d
+        WHERE d.content_hash = h
+          AND d.is_deleted = false
+        LIMIT 1
+    )
+    UNION ALL
+    (
+        SELECT 'processing_file'::text, pf.id, pf.original_filename, pf.status::text
+        FROM processing_files pf
+        WHERE pf.content_hash = h
+          AND pf.status::text IN (
+              'uploading',
+              'extracting',
+              'analyzing_metadata',
+              'generating_embeddings',
+              'review_pending',
+              'approved'
+          )
+        LIMIT 1
+    )
+    LIMIT 1;
+$$;
+
+-- Indexes so both lookups are index scans
+CREATE INDEX IF NOT EXISTS idx_documents_content_hash
+ON documents(content_hash);
+
+CREATE INDEX IF NOT EXISTS idx_processing_files_content_hash
+ON processing_files(content_hash);
+
+-- Comments for documentation
+COMMENT ON FUNCTION check_content_hash(text) IS 'Returns the existing library document or in-flight processing file with the given content hash, if any';
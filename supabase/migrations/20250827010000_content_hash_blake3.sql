@@ -0,0 +1,7 @@
+-- Switch content_hash to BLAKE3
+-- New uploads are hashed with BLAKE3 (64 hex characters, same width as SHA-256),
+-- so the column type is unchanged. Rows written before this migration hold SHA-256
+-- digests and only match re-uploads once they are re-hashed.
+
+COMMENT ON COLUMN documents.content_hash IS 'BLAKE3 hex digest of the original file content (SHA-256 for rows created before 2025-08-27)';
+COMMENT ON COLUMN processing_files.content_hash IS 'BLAKE3 hex digest of the uploaded file content (SHA-256 for rows created before 2025-08-27)';
@@ -0,0 +1,28 @@
+-- Partial indexes for content_hash deduplication lookups
+-- Narrow the indexes used by check_content_hash to the rows it can actually match:
+-- non-deleted documents and processing files in active pipeline/review states.
+-- Not built CONCURRENTLY because migrations run inside a transaction.
+
+CREATE INDEX IF NOT EXISTS idx_documents_content_hash_active
+ON documents(content_hash)
+WHERE is_deleted = false;
+
+-- Predicate mirrors the status filter in check_content_hash so the planner can use it
+CREATE INDEX IF NOT EXISTS idx_processing_files_content_hash_active
+ON processing_files(content_hash)
+WHERE status::text IN (
+    'uploading',
+    'extracting',
+    'analyzing_metadata',
+    'generating_embeddings',
+    'review_pending',
+    'approved'
+);
+
+-- Superseded by the partial indexes above
+DROP INDEX IF EXISTS idx_documents_content_hash;
+DROP INDEX IF EXISTS idx_processing_files_content_hash;
+
+-- Comments for documentation
+COMMENT ON INDEX idx_documents_content_hash_active IS 'Dedup lookups against library documents (check_content_hash)';
+COMMENT ON INDEX idx_processing_files_content_hash_active IS 'Dedup lookups against in-flight processing files (check_content_hash)';
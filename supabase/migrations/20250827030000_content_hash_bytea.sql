@@ -0,0 +1,57 @@
+-- Store content_hash as raw 32-byte bytea instead of 64-character hex text
+-- Halves the size of the content_hash columns and the dedup indexes built on them.
+-- The backend sends hashes as '\x<hex>' bytea literals.
+
+-- Step 1: Drop the text-typed lookup function before changing the column types
+DROP FUNCTION IF EXISTS check_content_hash(text);
+
+-- Step 2: Convert existing hex digests to raw bytes (indexes are rebuilt automatically)
+ALTER TABLE documents
+ALTER COLUMN content_hash TYPE bytea
+USING decode(content_hash, 'hex');
+
+ALTER TABLE processing_files
+ALTER COLUMN content_hash TYPE bytea
+USING decode(content_hash, 'hex');
+
+-- Step 3: Recreate the lookup function over bytea
+CREATE OR REPLACE FUNCTION check_content_hash(h bytea)
+RETURNS TABLE (
+    source text,
+    id uuid,
+    title text,
+    status text
+)
+LANGUAGE sql
+STABLE
+AS $$
+    -- Library documents take precedence over files still in the pipeline
+    (
+        SELECT 'document'::text, d.id, d.title, NULL::text
+        FROM documents d
+        WHERE d.content_hash = h
+          AND d.is_deleted = false
+        LIMIT 1
+    )
+    UNION ALL
+    (
+        SELECT 'processing_file'::text, pf.id, pf.original_filename, pf.status::text
+        FROM processing_files pf
+        WHERE pf.content_hash = h
+          AND pf.status::text IN (
+              'uploading',
+              'extracting',
+              'analyzing_metadata',
+              'generating_embeddings',
+              'review_pending',
+              'approved'
+          )
+        LIMIT 1
+    )
+    LIMIT 1;
+$$;
+
+-- Comments for documentation
+COMMENT ON FUNCTION check_content_hash(bytea) IS 'Returns the existing library document or in-flight processing file with the given content hash, if any';
+COMMENT ON COLUMN documents.content_hash IS 'BLAKE3 digest (32 raw bytes) of the original file content (SHA-256 for rows created before 2025-08-27)';
+COMMENT ON COLUMN processing_files.content_hash IS 'BLAKE3 digest (32 raw bytes) of the uploaded file content (SHA-256 for rows created before 2025-08-27)';
@@ -0,0 +1,19 @@
+-- Add embedding_cache table for reusing chunk embeddings across ingestions
+-- Keyed by the chunk content hash and embedding model, so re-ingesting a document
+-- (or ingesting pages shared with another document) skips the OpenAI call
+
+CREATE TABLE IF NOT EXISTS embedding_cache (
+    content_hash text NOT NULL,
+    model text NOT NULL,
+    embedding vector(1536) NOT NULL,
+    created_at timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (content_hash, model)
+);
+
+-- Backend-only table: accessed with the service key, never exposed to clients
+ALTER TABLE embedding_cache ENABLE ROW LEVEL SECURITY;
+
+-- Comments for documentation
+COMMENT ON TABLE embedding_cache IS 'Chunk embeddings keyed by content hash and model, checked before calling the embedding API';
+COMMENT ON COLUMN embedding_cache.content_hash IS 'BLAKE3 hex digest of the chunk text';
+COMMENT ON COLUMN embedding_cache.model IS 'Embedding model that produced the vector';
@@ -0,0 +1,62 @@
+-- Store chunk embeddings as half-precision vectors (pgvector halfvec, 0.7+)
+-- Halves each 1536-dim embedding from ~6 KB to ~3 KB, so the HNSW index and
+-- similarity scans read half the data; cosine recall loss from fp16 is negligible
+
+-- Step 1: Drop the float32 HNSW index before changing the column type
+DROP INDEX IF EXISTS idx_document_chunks_embedding_hnsw;
+
+-- Step 2: Convert chunk and cache embeddings to halfvec
+ALTER TABLE document_chunks
+    ALTER COLUMN embedding TYPE halfvec(1536) USING embedding::halfvec(1536);
+
+ALTER TABLE embedding_cache
+    ALTER COLUMN embedding TYPE halfvec(1536) USING embedding::halfvec(1536);
+
+-- Step 3: Rebuild the HNSW index with halfvec cosine operators
+CREATE INDEX IF NOT EXISTS idx_document_chunks_embedding_hnsw
+ON document_chunks USING hnsw (embedding halfvec_cosine_ops);
+
+-- Step 4: Recreate search_chunks so the query vector is cast to halfvec and the index is used
+-- Callers keep passing a vector(1536); the signature is unchanged
+DROP FUNCTION IF EXISTS search_chunks(vector, text[], integer, double precision);
+
+CREATE OR REPLACE FUNCTION search_chunks(
+    q vector(1536),
+    cats text[] DEFAULT NULL,
+    k integer DEFAULT 10,
+    thr double precision DEFAULT 0.0
+)
+RETURNS TABLE (
+    content text,
+    chunk_index integer,
+    original_filename text,
+    title text,
+    doc_type text,
+    doc_category text,
+    similarity_score double precision
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        dc.content,
+        dc.chunk_index,
+        d.original_filename,
+        d.title,
+        d.doc_type::text,
+        d.doc_category::text,
+        1 - (dc.embedding <=> q::halfvec(1536)) AS similarity_score
+    FROM document_chunks dc
+    JOIN documents d ON dc.document_id = d.id
+    WHERE d.is_reviewed = true
+      AND d.is_deleted = false
+      AND (cats IS NULL OR d.doc_category::text = ANY(cats))
+      AND 1 - (dc.embedding <=> q::halfvec(1536)) >= thr
+    ORDER BY dc.embedding <=> q::halfvec(1536)
+    LIMIT k;
+$$;
+
+-- Comments for documentation
+COMMENT ON COLUMN document_chunks.embedding IS 'Chunk embedding stored as half precision (halfvec)';
+COMMENT ON COLUMN embedding_cache.embedding IS 'Cached chunk embedding stored as half precision (halfvec)';
+COMMENT ON FUNCTION search_chunks(vector, text[], integer, double precision) IS 'Cosine similarity search over approved document chunks, filtered by doc_category and minimum similarity';
@@ -0,0 +1,60 @@
+-- Add approve_processing_file function for atomic, single round-trip approvals
+-- Replaces the SELECT processing_files + UPDATE documents + UPDATE processing_files
+-- sequence in ProcessingService.approve_file_for_library with one transaction
+
+CREATE OR REPLACE FUNCTION approve_processing_file(
+    fid uuid,
+    reviewer uuid,
+    notes text DEFAULT NULL
+)
+RETURNS uuid
+LANGUAGE plpgsql
+VOLATILE
+AS $$
+DECLARE
+    doc_id uuid;
+    file_status text;
+    reviewed timestamptz := now();
+BEGIN
+    -- Lock the file row so concurrent approvals/rejections can't interleave
+    SELECT pf.document_id, pf.status::text
+    INTO doc_id, file_status
+    FROM processing_files pf
+    WHERE pf.id = fid
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'File % not found', fid;
+    END IF;
+
+    IF doc_id IS NULL THEN
+        RAISE EXCEPTION 'No document linked to processing file %', fid;
+    END IF;
+
+    IF file_status <> 'review_pending' THEN
+        RAISE EXCEPTION 'File % is not ready for review (status: %)', fid, file_status;
+    END IF;
+
+    -- Document approved - mark as reviewed and active in library
+    UPDATE documents
+    SET is_reviewed = true,
+        reviewed_by = reviewer,
+        reviewed_at = reviewed,
+        review_notes = notes,
+        updated_at = reviewed
+    WHERE id = doc_id;
+
+    UPDATE processing_files
+    SET status = 'approved',
+        reviewed_by = reviewer,
+        reviewed_at = reviewed,
+        review_notes = notes,
+        updated_at = reviewed
+    WHERE id = fid;
+
+    RETURN doc_id;
+END;
+$$;
+
+-- Comments for documentation
+COMMENT ON FUNCTION approve_processing_file(uuid, uuid, text) IS 'Approves a review_pending processing file and its document in one transaction; returns the document id';
@@ -0,0 +1,38 @@
+-- Maintain updated_at in the database instead of sending client timestamps
+-- The backend no longer computes datetime.utcnow() for every status write; Postgres
+-- stamps rows on UPDATE with its own clock, so values are also free of client skew
+
+-- Step 1: Trigger function that stamps updated_at on every update
+CREATE OR REPLACE FUNCTION set_updated_at()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$;
+
+-- Step 2: Default updated_at on insert
+ALTER TABLE documents ALTER COLUMN updated_at SET DEFAULT now();
+ALTER TABLE processing_files ALTER COLUMN updated_at SET DEFAULT now();
+ALTER TABLE processing_jobs ALTER COLUMN updated_at SET DEFAULT now();
+
+-- Step 3: Attach the trigger to the tables the processing pipeline updates
+DROP TRIGGER IF EXISTS set_documents_updated_at ON documents;
+CREATE TRIGGER set_documents_updated_at
+BEFORE UPDATE ON documents
+FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+DROP TRIGGER IF EXISTS set_processing_files_updated_at ON processing_files;
+CREATE TRIGGER set_processing_files_updated_at
+BEFORE UPDATE ON processing_files
+FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+DROP TRIGGER IF EXISTS set_processing_jobs_updated_at ON processing_jobs;
+CREATE TRIGGER set_processing_jobs_updated_at
+BEFORE UPDATE ON processing_jobs
+FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+
+-- Comments for documentation
+COMMENT ON FUNCTION set_updated_at() IS 'BEFORE UPDATE trigger function that sets updated_at to now()';
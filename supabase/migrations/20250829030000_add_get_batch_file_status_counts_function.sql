@@ -0,0 +1,27 @@
+-- Add get_batch_file_status_counts function for server-side status aggregation
+-- ProcessingService.get_processing_status previously fetched every processing_files
+-- row of a batch just to bucket them by status in Python; this returns one row per status
+-- (Named apart from the existing get_batch_status_counts(), which /stats calls for all batches)
+
+CREATE OR REPLACE FUNCTION get_batch_file_status_counts(
+    bid uuid
+)
+RETURNS TABLE (
+    status text,
+    file_count bigint
+)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT pf.status::text, count(*)
+    FROM processing_files pf
+    WHERE pf.batch_id = bid
+    GROUP BY pf.status;
+$$;
+
+-- Index so the aggregate and the filtered row fetch don't scan the whole table
+CREATE INDEX IF NOT EXISTS idx_processing_files_batch_status
+ON processing_files (batch_id, status);
+
+-- Comments for documentation
+COMMENT ON FUNCTION get_batch_file_status_counts(uuid) IS 'Returns the number of processing files per status for a batch';
@@ -0,0 +1,21 @@
+-- Publish processing status changes over Supabase Realtime
+-- Lets the frontend subscribe to processing_files / processing_jobs row changes and
+-- show progress as stages complete, instead of polling GET /processing-status
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_publication_tables
+        WHERE pubname = 'supabase_realtime' AND tablename = 'processing_files'
+    ) THEN
+        ALTER PUBLICATION supabase_realtime ADD TABLE processing_files;
+    END IF;
+
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_publication_tables
+        WHERE pubname = 'supabase_realtime' AND tablename = 'processing_jobs'
+    ) THEN
+        ALTER PUBLICATION supabase_realtime ADD TABLE processing_jobs;
+    END IF;
+END;
+$$;
@@ -0,0 +1,41 @@
+-- Add update_pipeline_stage function for single round-trip stage transitions
+-- Replaces the paired processing_files status UPDATE + documents processing_status
+-- UPDATE (and, on completion, the processing_files cleanup UPDATE) issued per file
+
+CREATE OR REPLACE FUNCTION update_pipeline_stage(
+    fid uuid,
+    file_status text,
+    doc_status text,
+    clear_extracted boolean DEFAULT false
+)
+RETURNS uuid
+LANGUAGE plpgsql
+VOLATILE
+AS $$
+DECLARE
+    doc_id uuid;
+BEGIN
+    -- Large text fields are cleared once they have been copied to documents
+    UPDATE processing_files
+    SET status = file_status,
+        extracted_text = CASE WHEN clear_extracted THEN NULL ELSE extracted_text END,
+        preview_text = CASE WHEN clear_extracted THEN NULL ELSE preview_text END,
+        page_count = CASE WHEN clear_extracted THEN NULL ELSE page_count END,
+        word_count = CASE WHEN clear_extracted THEN NULL ELSE word_count END,
+        char_count = CASE WHEN clear_extracted THEN NULL ELSE char_count END,
+        chunk_count = CASE WHEN clear_extracted THEN NULL ELSE chunk_count END
+    WHERE id = fid
+    RETURNING document_id INTO doc_id;
+
+    IF doc_id IS NOT NULL THEN
+        UPDATE documents
+        SET processing_status = doc_status
+        WHERE id = doc_id;
+    END IF;
+
+    RETURN doc_id;
+END;
+$$;
+
+-- Comments for documentation
+COMMENT ON FUNCTION update_pipeline_stage(uuid, text, text, boolean) IS 'Sets a processing file status and its linked document processing_status in one transaction, optionally clearing extracted fields; returns the document id, or NULL if no document is linked';
@@ -0,0 +1,36 @@
+-- Link document_chunks to their document at insert time
+-- Chunks are inserted with only processing_file_id; ProcessingService used to follow up with an
+-- UPDATE document_chunks SET document_id = ... over every chunk of the file once processing finished
+
+-- Step 1: Trigger function that resolves document_id from the chunk's processing file
+CREATE OR REPLACE FUNCTION set_chunk_document_id()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF NEW.document_id IS NULL AND NEW.processing_file_id IS NOT NULL THEN
+        SELECT pf.document_id
+        INTO NEW.document_id
+        FROM processing_files pf
+        WHERE pf.id = NEW.processing_file_id;
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+-- Step 2: Attach the trigger to document_chunks
+DROP TRIGGER IF EXISTS set_document_id_on_chunk_insert ON document_chunks;
+CREATE TRIGGER set_document_id_on_chunk_insert
+BEFORE INSERT ON document_chunks
+FOR EACH ROW EXECUTE FUNCTION set_chunk_document_id();
+
+-- Step 3: Backfill chunks inserted before the trigger existed
+UPDATE document_chunks dc
+SET document_id = pf.document_id
+FROM processing_files pf
+WHERE dc.processing_file_id = pf.id
+  AND dc.document_id IS NULL
+  AND pf.document_id IS NOT NULL;
+
+-- Comments for documentation
+COMMENT ON FUNCTION set_chunk_document_id() IS 'BEFORE INSERT trigger function that links a chunk to the document of its processing file';
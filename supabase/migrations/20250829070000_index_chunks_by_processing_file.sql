@@ -0,0 +1,9 @@
+-- Index document_chunks by processing file
+-- LangChainDocumentProcessor deletes a file's existing chunks before inserting new ones, so a
+-- file resumed after an interrupted run isn't indexed twice; this keeps that delete off a seq scan
+
+CREATE INDEX IF NOT EXISTS idx_document_chunks_processing_file_id
+ON document_chunks (processing_file_id);
+
+-- Comments for documentation
+COMMENT ON INDEX idx_document_chunks_processing_file_id IS 'Looks up the chunks of a processing file for re-processing cleanup';
@@ -0,0 +1,50 @@
+-- Match uploads against SHA-256 content hashes written before the switch to BLAKE3
+-- Rows created before 20250827010000_content_hash_blake3 hold SHA-256 digests, so a BLAKE3
+-- lookup alone never finds them. FileService sends both digests until
+-- scripts/backfill_content_hash.py has re-hashed those rows (then set LEGACY_SHA256_DEDUP=false).
+
+-- Step 1: Drop the single-digest function so PostgREST doesn't see two overloads
+DROP FUNCTION IF EXISTS check_content_hash(bytea);
+
+-- Step 2: Recreate the lookup function with an optional legacy digest
+CREATE OR REPLACE FUNCTION check_content_hash(
+    h bytea,
+    legacy_h bytea DEFAULT NULL
+)
+RETURNS TABLE (
+    source text,
+    id uuid,
+    title text,
+    status text
+)
+LANGUAGE sql
+STABLE
+AS $$
+    -- Library documents take precedence over files still in the pipeline
+    (
+        SELECT 'document'::text, d.id, d.title, NULL::text
+        FROM documents d
+        WHERE d.content_hash IN (h, legacy_h)
+          AND d.is_deleted = false
+        LIMIT 1
+    )
+    UNION ALL
+    (
+        SELECT 'processing_file'::text, pf.id, pf.original_filename, pf.status::text
+        FROM processing_files pf
+        WHERE pf.content_hash IN (h, legacy_h)
+          AND pf.status::text IN (
+              'uploading',
+              'extracting',
+              'analyzing_metadata',
+              'generating_embeddings',
+              'review_pending',
+              'approved'
+          )
+        LIMIT 1
+    )
+    LIMIT 1;
+$$;
+
+-- Comments for documentation
+COMMENT ON FUNCTION check_content_hash(bytea, bytea) IS 'Returns the existing library document or in-flight processing file whose content hash is h (BLAKE3) or legacy_h (SHA-256), if any';
@@ -0,0 +1,40 @@
+-- Add leased claims on in-flight processing files
+-- Each backend process re-queues files left in flight by a stopped process. Without an owner,
+-- processes starting together (or a restart next to a live process) would queue the same files
+-- twice; a claim names the process running a file and expires unless that process renews it
+
+-- Step 1: Claim columns
+ALTER TABLE processing_files
+ADD COLUMN IF NOT EXISTS claimed_by text,
+ADD COLUMN IF NOT EXISTS claimed_at timestamptz;
+
+-- Step 2: Atomic claim of unowned or expired in-flight files
+-- A concurrent caller blocks on the row lock, then re-checks the WHERE clause against the
+-- committed claim and skips the row, so no file is returned to two claimants
+CREATE OR REPLACE FUNCTION claim_in_flight_files(
+    claimant text,
+    statuses text[],
+    lease_seconds integer
+)
+RETURNS TABLE (
+    file_id uuid
+)
+LANGUAGE sql
+VOLATILE
+AS $$
+    UPDATE processing_files pf
+    SET claimed_by = claimant,
+        claimed_at = now()
+    WHERE pf.status::text = ANY(statuses)
+      AND (
+          pf.claimed_by IS NULL
+          OR pf.claimed_by = claimant
+          OR pf.claimed_at < now() - make_interval(secs => lease_seconds)
+      )
+    RETURNING pf.id;
+$$;
+
+-- Comments for documentation
+COMMENT ON COLUMN processing_files.claimed_by IS 'Backend process running the file through the pipeline';
+COMMENT ON COLUMN processing_files.claimed_at IS 'When claimed_by last claimed or renewed the file; the claim lapses after the pipeline lease';
+COMMENT ON FUNCTION claim_in_flight_files(text, text[], integer) IS 'Claims in-flight processing files that are unclaimed, already held by the claimant (renewing them), or whose claim is older than lease_seconds; returns the claimed file ids';
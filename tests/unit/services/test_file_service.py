@@ -42,6 +42,22 @@ class TestFileService:
         """Create FileService instance for testing."""
         return FileService()
 
+    @pytest.fixture
+    def mock_insert_records(self, file_service):
+        """Stub the bulk record insert, returning one processing file ID per prepared file."""
+
+        async def insert_side_effect(prepared_files):
+            file_ids = [
+                f"123e4567-e89b-12d3-a456-42661417400{i}" for i in range(len(prepared_files))
+            ]
+            return file_ids, []
+
+        with patch.object(
+            file_service, "_insert_file_records", new_callable=AsyncMock
+        ) as mock_insert:
+            mock_insert.side_effect = insert_side_effect
+            yield mock_insert
+
     @pytest.fixture
     def mock_upload_file(self):
         """Create a mock UploadFile for testing."""
@@ -79,7 +95,9 @@ class TestFileService:
         return file
 
     @pytest.mark.asyncio
-    async def test_upload_single_file_success(self, file_service, mock_upload_file, mock_db):
+    async def test_upload_single_file_success(
+        self, file_service, mock_upload_file, mock_db, mock_insert_records
+    ):
         """Test successful upload of a single valid file."""
         user_id = "test-user-123"
 
@@ -94,7 +112,8 @@ class TestFileService:
                     mock_validate.return_value = Mock(is_valid=True, errors=[])
                     mock_process.return_value = {
                         "success": True,
-                        "file_id": "123e4567-e89b-12d3-a456-426614174001",
+                        "document_data": {"title": "test.pdf"},
+                        "file_data": {"original_filename": "test.pdf"},
                     }
 
                     # Execute
@@ -106,7 +125,7 @@ class TestFileService:
                     assert result.error_count == 0
 
     @pytest.mark.asyncio
-    async def test_upload_multiple_files_success(self, file_service, mock_db):
+    async def test_upload_multiple_files_success(self, file_service, mock_db, mock_insert_records):
         """Test successful upload of multiple valid files."""
         user_id = "test-user-123"
 
@@ -133,7 +152,8 @@ class TestFileService:
                     mock_validate.return_value = Mock(is_valid=True, errors=[])
                     mock_process.return_value = {
                         "success": True,
-                        "file_id": "123e4567-e89b-12d3-a456-426614174001",
+                        "document_data": {"title": "test.pdf"},
+                        "file_data": {"original_filename": "test.pdf"},
                     }
 
                     # Execute
@@ -144,6 +164,7 @@ class TestFileService:
                     assert result.success_count == 3
                     assert result.error_count == 0
                     assert mock_process.call_count == 3  # Called for each file
+                    mock_insert_records.assert_awaited_once()  # One bulk insert for the batch
 
     @pytest.mark.asyncio
     async def test_upload_exceeds_batch_limit(self, file_service):
@@ -216,7 +237,7 @@ class TestFileService:
 
     @pytest.mark.asyncio
     async def test_upload_mixed_valid_invalid_files(
-        self, file_service, mock_upload_file, mock_invalid_file, mock_db
+        self, file_service, mock_upload_file, mock_invalid_file, mock_db, mock_insert_records
     ):
         """Test handling of mixed valid and invalid files."""
         user_id = "test-user-123"
@@ -224,7 +245,7 @@ class TestFileService:
 
         def process_side_effect(file, job_id, user_id):
             if file.filename.endswith(".pdf"):
-                return {"success": True, "file_id": "123e4567-e89b-12d3-a456-426614174001"}
+                return {"success": True, "document_data": {}, "file_data": {}}
             else:
                 return {"success": False, "error": "Invalid file type"}
 
@@ -248,6 +269,163 @@ class TestFileService:
                 assert len(result.failed_files) == 1
                 assert result.failed_files[0]["filename"] == "malware.exe"
 
+    @pytest.mark.asyncio
+    async def test_insert_file_records_falls_back_per_file(self, file_service):
+        """Test that one bad row only fails its own file when the bulk insert fails."""
+        prepared_files = [
+            {"file_data": {"original_filename": f"test_{i}.pdf"}, "storage_path": f"uploads/{i}"}
+            for i in range(3)
+        ]
+
+        async def insert_side_effect(batch):
+            if len(batch) > 1 or batch[0]["file_data"]["original_filename"] == "test_1.pdf":
+                raise Exception("bad row")
+            return [batch[0]["storage_path"]]
+
+        with patch.object(
+            file_service, "_insert_file_record_rows", new_callable=AsyncMock
+        ) as mock_rows:
+            with patch.object(file_service, "delete_file", new_callable=AsyncMock) as mock_delete:
+                mock_rows.side_effect = insert_side_effect
+
+                uploaded, failed = await file_service._insert_file_records(prepared_files)
+
+                assert uploaded == ["uploads/0", "uploads/2"]
+                assert len(failed) == 1
+                assert failed[0]["filename"] == "test_1.pdf"
+                assert "bad row" in failed[0]["error"]
+                # Only the failed file's stored object is removed
+                mock_delete.assert_awaited_once_with("uploads/1")
+
+    @pytest.mark.asyncio
+    async def test_insert_file_record_rows_rolls_back_documents(self, file_service):
+        """Test that documents rows are deleted again when the processing_files insert fails."""
+        client = Mock()
+        documents = Mock()
+        processing_files = Mock()
+        client.table.side_effect = lambda name: (
+            documents if name == "documents" else processing_files
+        )
+        documents.insert.return_value.execute = AsyncMock(return_value=Mock(data=[{"id": "doc-1"}]))
+        processing_files.insert.return_value.execute = AsyncMock(side_effect=Exception("bad row"))
+        rollback_execute = AsyncMock()
+        documents.delete.return_value.in_.return_value.execute = rollback_execute
+
+        prepared = {"document_data": {}, "file_data": {}, "content_hash": "abc"}
+        with patch("app.services.file_service.db") as mock_db:
+            mock_db.get_supabase_client = AsyncMock(return_value=client)
+
+            with pytest.raises(Exception, match="bad row"):
+                await file_service._insert_file_record_rows([prepared])
+
+        documents.delete.return_value.in_.assert_called_once_with("id", ["doc-1"])
+        rollback_execute.assert_awaited_once()
+
+    def test_hash_cache_entries_expire(self, file_service):
+        """Test that cached duplicates are served until the TTL passes, then evicted."""
+        duplicate = {"success": False, "error": "Document already exists", "is_duplicate": True}
+        file_service.hash_cache_ttl = 10
+
+        with patch("app.services.file_service.time") as mock_time:
+            mock_time.monotonic.return_value = 100.0
+            file_service._cache_duplicate("abc", duplicate)
+
+            mock_time.monotonic.return_value = 109.0
+            assert file_service._get_cached_duplicate("abc") == duplicate
+
+            mock_time.monotonic.return_value = 111.0
+            assert file_service._get_cached_duplicate("abc") is None
+            assert "abc" not in file_service._hash_cache
+
+    def test_hash_cache_evicts_least_recently_used(self, file_service):
+        """Test that the cache stays bounded, dropping the least recently used hash."""
+        file_service.hash_cache_size = 2
+        file_service._cache_duplicate("a", {"error": "a"})
+        file_service._cache_duplicate("b", {"error": "b"})
+        file_service._get_cached_duplicate("a")  # Touch a so b is least recently used
+        file_service._cache_duplicate("c", {"error": "c"})
+
+        assert list(file_service._hash_cache) == ["a", "c"]
+
+    @pytest.mark.asyncio
+    async def test_duplicate_in_flight_rejected_before_storage(self, file_service):
+        """Test that a file identical to one still being uploaded never reaches storage."""
+        from app.utils.file_utils import calculate_content_hash
+
+        content = b"%PDF-1.4 duplicate"
+        file_service._inflight_hashes[calculate_content_hash(content)] = ("job-1", "first.pdf")
+        upload = UploadFile(
+            filename="second.pdf",
+            file=io.BytesIO(content),
+            size=len(content),
+            headers={"content-type": "application/pdf"},
+        )
+
+        with patch.object(file_service.validator, "validate_file") as mock_validate:
+            with patch("app.services.file_service.db") as mock_db:
+                mock_validate.return_value = Mock(is_valid=True, errors=[])
+
+                result = await file_service._process_single_file(upload, "job-2", "user-1")
+
+                mock_db.get_supabase_client.assert_not_called()
+
+        assert result["is_duplicate"]
+        assert "first.pdf" in result["error"]
+
+    def test_release_hashes_only_releases_own_job(self, file_service):
+        """Test that a finished job releases its claims and leaves other jobs' claims alone."""
+        file_service._inflight_hashes = {"a": ("job-1", "a.pdf"), "b": ("job-2", "b.pdf")}
+
+        file_service._release_hashes("job-1")
+
+        assert file_service._inflight_hashes == {"b": ("job-2", "b.pdf")}
+
+    @pytest.mark.asyncio
+    async def test_failed_storage_upload_releases_hash_claim(self, file_service):
+        """Test that a file that fails to store frees its hash for the rest of the job."""
+        content = b"%PDF-1.4 retry me"
+        upload = UploadFile(
+            filename="report.pdf",
+            file=io.BytesIO(content),
+            size=len(content),
+            headers={"content-type": "application/pdf"},
+        )
+        client = Mock()
+        client.storage.from_.return_value.upload = AsyncMock(side_effect=Exception("Timeout"))
+
+        with patch.object(file_service.validator, "validate_file") as mock_validate:
+            with patch.object(file_service, "_find_duplicate", new_callable=AsyncMock) as mock_dup:
+                with patch("app.services.file_service.db") as mock_db:
+                    mock_validate.return_value = Mock(is_valid=True, errors=[])
+                    mock_dup.return_value = None
+                    mock_db.get_supabase_client = AsyncMock(return_value=client)
+
+                    result = await file_service._process_single_file(upload, "job-1", "user-1")
+
+        assert not result["success"]
+        assert file_service._inflight_hashes == {}
+
+    @pytest.mark.asyncio
+    async def test_only_library_duplicates_are_cached(self, file_service):
+        """Test that in-pipeline matches are re-checked so failed files can be retried."""
+        matches = {
+            "lib": {"source": "document", "id": "doc-1", "title": "Report"},
+            "pipe": {"source": "processing_file", "id": "pf-1", "title": "Report", "status": "x"},
+        }
+        client = Mock()
+        client.rpc.side_effect = lambda name, params: Mock(
+            execute=AsyncMock(return_value=Mock(data=[matches[params["h"][2:]]]))
+        )
+
+        with patch("app.services.file_service.db") as mock_db:
+            mock_db.get_supabase_client = AsyncMock(return_value=client)
+
+            assert (await file_service._find_duplicate("lib"))["is_duplicate"]
+            assert (await file_service._find_duplicate("pipe"))["is_duplicate"]
+
+        assert file_service._get_cached_duplicate("lib") is not None
+        assert file_service._get_cached_duplicate("pipe") is None
+
     def test_file_service_initialization(self):
         """Test FileService initializes correctly."""
         with patch("app.services.file_service.ProcessingService"):